@@ -1,25 +1,28 @@
 import pandas as pd
-import sqlite3
+import db
 import os
-import csv
 import webbrowser
 from datetime import datetime, date, timedelta
 import streamlit as st
 import requests
 from tqdm import tqdm
 import plotly.express as px
+import backfill
+import ingest
+import migrations
+import rollup
+import star
 
 def init_db(q):
-    conn = sqlite3.connect("chai.db")
+    conn = db.get_connection()
     c = conn.cursor()
     c.execute(q)
     conn.commit()
     conn.close()
-# SQLite connection
-conn = sqlite3.connect('chai.db')
-cursor = conn.cursor()
+migrations.migrate_once()
+# SQLite connections come from the shared pool; each function takes its own
 def get_connection():
-    return sqlite3.connect('chai.db')
+    return db.get_connection()
 # File configurations
 today = date.today()
 file_date = today.strftime("%d-%m-%Y")
@@ -69,14 +72,20 @@ def tracking():
 def download_file_by_date(start_date, end_date):
     """Download file using start_date and end_date."""
     url = f"https://champs.billionlives.in:8000/consultation_api/getCallLogsCSV?startdate={start_date}&enddate={end_date}"
-    response = requests.get(url)
+    # Same retrying session and timeouts as the backfill, so a stalled API can't hang the page
+    try:
+        response = backfill.make_session().get(url, stream=True, timeout=backfill.TIMEOUT)
+    except requests.RequestException as e:
+        st.error(f"Failed to download file: {e}")
+        return
 
     if response.status_code == 200:
         csv_file_path = "dataset.csv"
-        with open("dataset.csv", "wb") as file:
-            file.write(response.content)
+        # Read the response in chunks, saving it to dataset.csv while it is parsed
+        response.raw.decode_content = True
+        with open(csv_file_path, "wb") as file:
+            export_to_sql(ingest.TeeReader(response.raw, file))
         st.success("File downloaded successfully as dataset.csv!")
-        export_to_sql()
         if sqlite_to_excel():
             st.success("File downloaded and exported to Excel successfully!")
     else:
@@ -99,8 +108,6 @@ def csv_to_excel():
         st.success("New Excel file created successfully!")
 
 def csv_to_sqlite():
-    conn = get_connection()  # Get connection in the current thread
-    cursor = conn.cursor()
     uploaded_file = st.file_uploader("Choose a file", type=["csv", "xlsx"])
 
     if uploaded_file is not None:
@@ -109,29 +116,20 @@ def csv_to_sqlite():
 
         # Process CSV or Excel file
         if uploaded_file.name.endswith(".csv"):
-
-            with open(uploaded_file.name, 'r') as file:
-                tname=uploaded_file.name.split(".")
-
-                csv_reader = csv.reader(file)
-                headers = next(csv_reader)
-                
-                # Create the table if it doesn't exist
-                create_table_query = f"CREATE TABLE IF NOT EXISTS {tname[0]} ({', '.join(headers)});"
-                cursor.execute(create_table_query)
-                
-                # Insert data
-                insert_data_query = f"INSERT INTO {tname[0]} VALUES ({', '.join(['?'] * len(headers))});"
-                for row in csv_reader:
-                    cursor.execute(insert_data_query, row)
-            
-            conn.commit()
-            st.success("CSV data inserted into SQLite successfully!")
+            # Stream the uploaded buffer straight into the table in large batches
+            tname = ingest.table_name_for(uploaded_file.name)
+            try:
+                result = ingest.bulk_load_csv(uploaded_file, tname)
+                st.success("CSV data inserted into SQLite successfully!")
+                st.write(f"{result['rows']} rows in {result['seconds']:.2f}s "
+                         f"({result['rows_per_sec']:.0f} rows/sec)")
+            except Exception as e:
+                st.error(f"Error loading CSV: {e}")
 
 def sqlite_to_excel():
     try:
         # Create a new connection in the current thread
-        conn = sqlite3.connect('chai.db')
+        conn = db.get_connection()
         
         # Execute the query
         query = "SELECT * FROM daily_calls;"
@@ -151,33 +149,24 @@ def sqlite_to_excel():
 
 def sql_to_excel_datewise(start_date, end_date):
     query = f"SELECT * FROM daily_calls WHERE date >= '{start_date}' AND date <= '{end_date}';"
-    df = pd.read_sql_query(query, conn)
+    conn = get_connection()
+    try:
+        df = pd.read_sql_query(query, conn)
+    finally:
+        conn.close()
     excel_file_path = f'calls_{start_date}_{end_date}.xlsx'
     df.to_excel(excel_file_path, index=False)
     st.success(f"Data exported to {excel_file_path}")
 
 
 
-def export_csv_sql(df):
-    df['Date'] = pd.to_datetime(df['Date'], format='%Y-%d-%m').dt.strftime('%Y-%d-%m')
-
-    # Add new columns for day, month, and year
-    df['day'] = pd.to_datetime(df['Date']).dt.day
-    df['month'] = pd.to_datetime(df['Date']).dt.strftime('%B')  # Month name
-    df['year'] = pd.to_datetime(df['Date']).dt.year
-
-    # Write the DataFrame to the SQLite database
-    conn = sqlite3.connect('chai.db')  # Ensure connection is created in the current thread
-    try:
-        df.to_sql("daily_calls", conn, if_exists='append', index=False)
-        conn.commit()
-        st.write(f"{len(df)} Data exported successfully!")
-    except Exception as e:
-        print(f"Error: {e}")
-    finally:
-        conn.close()
+# Date layout of the files each upload menu is for, by extension
+UPLOAD_DATE_FORMATS = {
+    "Upload File(-)": {".csv": "%m-%d-%Y", ".xlsx": "%d-%m-%Y"},
+    "Upload File(/)": {".csv": "%m-%d-%Y", ".xlsx": "%m/%d/%Y"},
+}
 
-def uploaded_file():
+def uploaded_file(date_formats):
     st.title("Upload File")
 
     # File upload
@@ -187,101 +176,45 @@ def uploaded_file():
         # Show the uploaded file name
         st.success(f"Uploaded file: {uploaded_file.name}")
 
-        # Process CSV or Excel file
-        if uploaded_file.name.endswith(".csv"):
-            df1 = pd.read_csv(uploaded_file)
-            #st.write(df1["Date"].unique())
-            df1['Date'] = pd.to_datetime(df1['Date'], format='%m-%d-%Y')
-            df1['Date'] = df1['Date'].dt.strftime('%Y-%d-%m')
-            export_csv_sql(df1)
-        elif uploaded_file.name.endswith(".xlsx"):
-            df1 = pd.read_excel(uploaded_file)
-            st.write(df1["Date"].unique())
-            df1['Date'] = pd.to_datetime(df1['Date'], format='%d-%m-%Y')
-            df1['Date'] = df1['Date'].dt.strftime('%Y-%d-%m')
-            export_csv_sql(df1)
-            sqlite_to_excel()
-            
+        # CSV and Excel files go through the same pipeline, each with its known Date format
+        try:
+            date_format = date_formats[os.path.splitext(uploaded_file.name)[1].lower()]
+            n, counts = ingest.import_file(uploaded_file, uploaded_file.name, date_format=date_format)
+            st.write(f"{n} Data exported successfully!")
+            st.write(f"Inserted: {counts['inserted']}, Updated: {counts['updated']}, Skipped: {counts['skipped']}")
+            if uploaded_file.name.endswith(".xlsx"):
+                sqlite_to_excel()
+        except Exception as e:
+            st.error(f"Error: {e}")
+
         # Display the uploaded DataFrame
-        
+        uploaded_file.seek(0)
         st.write("Preview of Uploaded File:")
-        st.write(df1.head())
-
-def export_csv_sqlS(df):
-    df['Date'] = pd.to_datetime(df['Date'], format='%Y-%m-%d').dt.strftime('%Y-%m-%d')
-
-    # Add new columns for day, month, and year
-    df['day'] = pd.to_datetime(df['Date']).dt.day
-    df['month'] = pd.to_datetime(df['Date']).dt.strftime('%B')  # Month name
-    df['year'] = pd.to_datetime(df['Date']).dt.year
-
-    # Write the DataFrame to the SQLite database
-    conn = sqlite3.connect('chai.db')  # Ensure connection is created in the current thread
-    try:
-        df.to_sql("daily_calls", conn, if_exists='append', index=False)
-        conn.commit()
-        st.write(f"{len(df)} Data exported successfully!")
-    except Exception as e:
-        print(f"Error: {e}")
-    finally:
-        conn.close()
-
-def uploaded_fileS():
-    st.title("Upload File")
+        if uploaded_file.name.endswith(".csv"):
+            st.write(pd.read_csv(uploaded_file, nrows=5))
+        else:
+            st.write(pd.read_excel(uploaded_file, nrows=5))
 
-    # File upload
-    uploaded_file = st.file_uploader("Choose a file", type=["csv", "xlsx"])
+def export_to_sql(source=csvfile):
+    status = st.empty()
 
-    if uploaded_file is not None:
-        # Show the uploaded file name
-        st.success(f"Uploaded file: {uploaded_file.name}")
+    def show_progress(rows, elapsed):
+        rate = rows / elapsed if elapsed else 0
+        status.write(f"{rows} rows processed ({rate:.0f} rows/sec)")
 
-        # Process CSV or Excel file
-        if uploaded_file.name.endswith(".csv"):
-            df1 = pd.read_csv(uploaded_file)
-            #st.write(df1["Date"].unique())
-            df1['Date'] = pd.to_datetime(df1['Date'], format='%m-%d-%Y')
-            df1['Date'] = df1['Date'].dt.strftime('%Y-%d-%m')
-            export_csv_sqlS(df1)
-        elif uploaded_file.name.endswith(".xlsx"):
-            df1 = pd.read_excel(uploaded_file)
-            st.write(df1["Date"].unique())
-            df1['Date'] = pd.to_datetime(df1['Date'], format='%m/%d/%Y')
-            df1['Date'] = df1['Date'].dt.strftime('%Y-%m-%d')
-            export_csv_sqlS(df1)
-            sqlite_to_excel()
-       
-        # Display the uploaded DataFrame
-        
-        st.write("Preview of Uploaded File:")
-        st.write(df1.head())
-def export_to_sql():
-    # Read the CSV file
-    df = pd.read_csv(csvfile)
-    n=len(df)
-
-    # Convert the 'Date' column to the correct format
-    df['Date'] = pd.to_datetime(df['Date'], format='%d-%m-%Y').dt.strftime('%Y-%m-%d')
-
-    # Add new columns for day, month, and year
-    df['day'] = pd.to_datetime(df['Date']).dt.day
-    df['month'] = pd.to_datetime(df['Date']).dt.strftime('%B')  # Month name
-    df['year'] = pd.to_datetime(df['Date']).dt.year
-
-    # Write the DataFrame to the SQLite database
-    conn = sqlite3.connect('chai.db')  # Ensure connection is created in the current thread
+    # Stream the CSV into the database chunk by chunk; dates are parsed once per chunk
+    # and rows are upserted so re-downloading a range doesn't duplicate them
     try:
-        df.to_sql("daily_calls", conn, if_exists='append', index=False)
-        conn.commit()
+        n, counts = ingest.stream_calls(source, on_progress=show_progress, label="date_wise",
+                                         date_format=ingest.API_DATE_FORMAT)
         st.write(f"{n} Datas exported successfully!")
+        st.write(f"Inserted: {counts['inserted']}, Updated: {counts['updated']}, Skipped: {counts['skipped']}")
 
     except Exception as e:
         print(f"Error: {e}")
-    finally:
-        conn.close()
 
 def execute_and_export(q):
-    conn = sqlite3.connect("chai.db")
+    conn = db.get_connection()
     c = conn.cursor()
     try:
         # Execute the query
@@ -302,15 +235,11 @@ def execute_and_export(q):
         conn.close()
 
 def active_sisters_filter():
-        # Connect to the database
-    conn = sqlite3.connect('chai.db')  # Update with your database connection
-
-    # Initial query to fetch all data
-    q2 = "SELECT * FROM daily_calls"
-    df = pd.read_sql_query(q2, conn)
+    # Daily counts from the rollup table instead of every consultation
+    df = rollup.load_rollup()
 
     # Get unique regional units and add "ALL" at the beginning
-    reg = df['RegionalUnit'].unique().tolist()
+    reg = star.dimension_values('RegionalUnit')  # from the small dim_region table
     reg.insert(0, "ALL")
     ru = st.sidebar.selectbox("Select Regional Unit", reg)
 
@@ -323,224 +252,158 @@ def active_sisters_filter():
           "July", "August", "September", "October", "November", "December"]
     sm = st.sidebar.selectbox("Select Month", m1)
 
-    # Query based on the Regional Unit selection
-    if ru == "ALL":
-        q2 = "SELECT * FROM daily_calls"
-    else:
-        q2 = f"SELECT * FROM daily_calls WHERE RegionalUnit = '{ru}'"
-    
-    # Fetch data from the database again based on the selected regional unit
-    df = pd.read_sql_query(q2, conn)
+    # Filter by the selected regional unit
+    if ru != "ALL":
+        df = df[df['RegionalUnit'] == ru]
 
     # Filter by selected year
     if y != "select":
-        if "year" in df.columns:
-            df = df[df["year"] == int(y)]
-        else:
-            st.write("The 'year' column is missing from the data.")
-            conn.close()
-            return  # Exit if the year column is missing
+        df = df[df["year"] == int(y)]
 
     # Filter by selected month
     if sm != "select":
-        df = df[df['month'] == sm]
-    
+        df = df[df['month_name'] == sm]
+
     # Display results
     st.title("Active Sisters")
     active_sisters = df['Nurse Name'].unique()
     st.header(f"Total Active Sisters: {len(active_sisters)}")
-    
+
     df = df.rename(columns={"Nurse Name": "NurseName"})
-    st.header(f"Total No. of Calls: {len(df)}")
-    
+    st.header(f"Total No. of Calls: {int(df['calls'].sum())}")
+
     # Count calls per sister
-    sister_count = df["NurseName"].value_counts()
+    sister_count = rollup.call_counts(df, "NurseName")
     st.write(sister_count)
 
     # Create a bar chart for the top 10 sisters with the most calls
     top_sisters = sister_count.head(10)
     fig = px.bar(top_sisters.reset_index(),
-                 x='index',
-                 y='NurseName',
-                 labels={'index': 'Sister Name', 'NurseName': 'Number of Calls'},
+                 x='NurseName',
+                 y='calls',
+                 labels={'NurseName': 'Sister Name', 'calls': 'Number of Calls'},
                  title='Top 10 Sisters with Most Calls')
     fig.update_traces(texttemplate='%{y}', textposition='outside')
     st.plotly_chart(fig)
 
-    # Close the database connection
-    conn.close()
-   
 
 def doctor_wise_records_filter():
-    conn = sqlite3.connect('chai.db')  # Update with your database connection
     y = st.sidebar.selectbox("Select Year", ["select", "2022", "2023", "2024", "2025", "2026"])
     st.write(f"Selected Year: {y}")
     m1 = ["select", "January", "February", "March", "April", "May", "June",
           "July", "August", "September", "October", "November", "December"]
     sm = st.sidebar.selectbox("Select Month", m1)
-    # Query to fetch doctor-wise records
-    q2 = "SELECT * FROM daily_calls"
-    # Fetch data from the database
-    df = pd.read_sql_query(q2, conn)
+    # Doctor-wise counts from the rollup table
+    df = rollup.load_rollup()
     # Filter by year
     if y != "select":
-        if "year" in df.columns:
-            df = df[df["year"] == int(y)]
-        else:
-            st.write("The 'year' column is missing from the data.")
+        df = df[df["year"] == int(y)]
     else:
         st.write("Please select a valid year.")
         st.title("Doctor-wise Records")
         # Extract and display unique doctors
     unique_doctors = df['doctorName'].unique()
     st.header(f"Total Unique Doctors: {len(unique_doctors)}")
-    # Rename columns for consistency
-    df = df.rename(columns={"doctorName": "doctorName"})
     # Count records for each doctor
-    doctor_count = df["doctorName"].groupby(df["doctorName"]).count()
-    st.header(f"Total No. of Calls: {len(df)}")
+    doctor_count = df.groupby("doctorName")["calls"].sum()
+    st.header(f"Total No. of Calls: {int(df['calls'].sum())}")
     st.write(doctor_count)
-    conn.close()
 
     # Filter by month
     if sm!="select":
-        df = df[df['month'] == sm]
+        df = df[df['month_name'] == sm]
 
 def regional_wise_filter():
-    conn = sqlite3.connect('chai.db')  # Update with your database connection
-    q2 = "SELECT * FROM daily_calls"
-    df = pd.read_sql_query(q2, conn)
-    
+    # Regional counts from the rollup table
+    df = rollup.load_rollup()
+
     # Extract unique regional units
-    reg = df['RegionalUnit'].unique()
+    reg = star.dimension_values('RegionalUnit')  # from the small dim_region table
     reg = ["All"] + list(reg)  # Add "All" option
     ru = st.sidebar.selectbox("Select Regional Unit", reg)
     y = st.sidebar.selectbox("Select Year", ["select", "2022", "2023", "2024", "2025", "2026"])
     st.write(f"Selected Year: {y}")
-    
+
     m1 = ["select", "January", "February", "March", "April", "May", "June",
           "July", "August", "September", "October", "November", "December"]
     sm = st.sidebar.selectbox("Select Month", m1)
-    
-    # Fetch all data first to get unique regional units
-    
-    
+
     # Filter by regional unit
     if ru != "All":
         df = df[df['RegionalUnit'] == ru]
-    
+
     # Filter by year
     if y != "select":
-        if "year" in df.columns:
-            df = df[df["year"] == int(y)]
-        else:
-            st.write("The 'year' column is missing from the data.")
-            conn.close()
-            return  # Exit if the year column is missing
+        df = df[df["year"] == int(y)]
     else:
         st.write("Please select a valid year.")
-        conn.close()
         return  # Exit if no valid year is selected
-    
+
     # Filter by month
     if sm != "select":
-        df = df[df['month'] == sm]
-    
+        df = df[df['month_name'] == sm]
+
     st.title("Regional Wise Records")
-    
+
     # Rename columns for consistency
     df = df.rename(columns={"RegionalUnit": "Regional Unit"})
-    
+
     # Count records for each regional unit
-    ru_count = df["Regional Unit"].value_counts()
-    
-    st.header(f"Total No. of Calls: {len(df)}")
+    ru_count = rollup.call_counts(df, "Regional Unit")
+
+    st.header(f"Total No. of Calls: {int(df['calls'].sum())}")
     st.write(ru_count)
-    fig = px.bar(ru_count.reset_index(), 
-        x='index', 
-        y='Regional Unit', 
-        labels={'index': 'Regional Unit', 'Regional Unit': 'Number of Calls'},
+    fig = px.bar(ru_count.reset_index(),
+        x='Regional Unit',
+        y='calls',
+        labels={'calls': 'Number of Calls'},
         title='Number of Calls per Regional Unit')
     fig.update_traces(texttemplate='%{y}', textposition='outside')
     st.plotly_chart(fig)  # Display the chart
-    conn.close()
 
 def date_wise():
-    conn = sqlite3.connect('chai.db')  # Update with your database connection
-    
     # Allow the user to select a specific date
     selected_date = st.sidebar.date_input("Select a Date")
     st.write(f"Selected Date: {selected_date}")
-    
-    # Query to fetch all data
-    q2 = "SELECT * FROM daily_calls"
-    df = pd.read_sql_query(q2, conn)
-    
-    # Ensure the 'date' column exists and is properly formatted
-    if "Date" in df.columns:
-        df['Date'] = pd.to_datetime(df['Date'])
-    else:
-        st.write("The 'date' column is missing from the data.")
-        conn.close()
-        return  # Exit if the date column is missing
-    
-    # Filter by the selected date
-    df = df[df['Date'].dt.date == selected_date]  # Use .dt.date to compare only the date part
-    
+
+    # Rollup rows for just the selected date
+    day = selected_date.strftime('%Y-%m-%d')
+    df = rollup.load_rollup(day, day)
+
     if df.empty:
         st.write("No data found for the selected date.")
-        conn.close()
         return  # Exit if no data is found for the selected date
-    
+
     st.title(f"Records for {selected_date}")
-    
+
     # Active Sisters Analysis
     st.header("Active Sisters")
     active_sisters = df['Nurse Name'].unique()
     st.write(f"Total Active Sisters: {len(active_sisters)}")
     df = df.rename(columns={"Nurse Name": "NurseName"})
-    st.header(f"Total No. of calls:{len(df)}")
-    sister_count = df["NurseName"].value_counts()
+    st.header(f"Total No. of calls:{int(df['calls'].sum())}")
+    sister_count = rollup.call_counts(df, "NurseName")
     st.write(sister_count)
-    
+
     # Doctor-Wise Analysis
     st.header("Doctor-Wise Records")
-    if "doctorName" in df.columns:
-        unique_doctors = df['doctorName'].unique()
-        st.write(f"Total Unique Doctors: {len(unique_doctors)}")
-        doctor_count = df['doctorName'].value_counts()
-        st.write(doctor_count)
-    else:
-        st.write("The 'doctorName' column is missing from the data.")
-    
+    unique_doctors = df['doctorName'].unique()
+    st.write(f"Total Unique Doctors: {len(unique_doctors)}")
+    doctor_count = rollup.call_counts(df, "doctorName")
+    st.write(doctor_count)
+
     # Regional-Wise Analysis
     st.header("Regional-Wise Records")
-    if "RegionalUnit" in df.columns:
-        regional_unit_count = df["RegionalUnit"].value_counts()
-        st.write(f"Total Calls by Regional Unit:")
-        st.write(regional_unit_count)
-        
-        # Create a bar chart for Regional Units
-        # fig = px.bar(regional_unit_count.reset_index(),
-        #              x='index',
-        #              y=regional_unit_count.values,
-        #              labels={'index': 'Regional Unit', 'y': 'Number of Calls'},
-        #              title='Number of Calls per Regional Unit')
-        # fig.update_traces(texttemplate='%{y}', textposition='outside')
-        # st.plotly_chart(fig)
-    else:
-        st.write("The 'RegionalUnit' column is missing from the data.")
-    
-def month_wise_filter():
-        # Connect to the database
-    conn = sqlite3.connect('chai.db')  # Update with your database connection
+    regional_unit_count = rollup.call_counts(df, "RegionalUnit")
+    st.write(f"Total Calls by Regional Unit:")
+    st.write(regional_unit_count)
 
-    # Initial query to fetch all data
-    q2 = "SELECT * FROM daily_calls"
-    df = pd.read_sql_query(q2, conn)
+def month_wise_filter():
+    # Daily counts from the rollup table instead of every consultation
+    df = rollup.load_rollup()
 
     # Get unique regional units and add "ALL" at the beginning
-    reg = df['RegionalUnit'].unique().tolist()
+    reg = star.dimension_values('RegionalUnit')  # from the small dim_region table
     reg.insert(0, "ALL")
     ru = st.sidebar.selectbox("Select Regional Unit", reg)
 
@@ -553,53 +416,25 @@ def month_wise_filter():
           "July", "August", "September", "October", "November", "December"]
     sm = st.sidebar.selectbox("Select Month", m1)
 
-    # Query based on the Regional Unit selection
-    if ru == "ALL":
-        q2 = "SELECT * FROM daily_calls"
-    else:
-        q2 = f"SELECT * FROM daily_calls WHERE RegionalUnit = '{ru}'"
-    
-    # Fetch data from the database again based on the selected regional unit
-    df = pd.read_sql_query(q2, conn)
+    # Filter by the selected regional unit
+    if ru != "ALL":
+        df = df[df['RegionalUnit'] == ru]
 
     # Filter by selected year
     if y != "select":
-        if "year" in df.columns:
-            df = df[df["year"] == int(y)]
-        else:
-            st.write("The 'year' column is missing from the data.")
-            conn.close()
-            return  # Exit if the year column is missing
+        df = df[df["year"] == int(y)]
 
     # Filter by selected month
     if sm != "select":
-        df = df[df['month'] == sm]
+        df = df[df['month_name'] == sm]
 
     # Display results
     st.title("Date wise call")
-    active_sisters = df['month'].unique()
-    #st.header(f"Total Active Sisters: {len(active_sisters)}")
-    
-    #df = df.rename(columns={"Nurse Name": "NurseName"})
-    st.header(f"Total No. of Calls: {len(df)}")
-    
-    # Count calls per sister
-    date_count = df["Date"].value_counts()
-    st.write(date_count)
+    st.header(f"Total No. of Calls: {int(df['calls'].sum())}")
 
-    # # Create a bar chart for the top 10 sisters with the most calls
-    # top_sisters = sister_count.head(10)
-    # fig = px.bar(top_sisters.reset_index(),
-    #              x='index',
-    #              y='NurseName',
-    #              labels={'index': 'Sister Name', 'NurseName': 'Number of Calls'},
-    #              title='Top 10 Sisters with Most Calls')
-    # fig.update_traces(texttemplate='%{y}', textposition='outside')
-    # st.plotly_chart(fig)
-
-    # Close the database connection
-    conn.close()
-    conn.close()
+    # Count calls per date
+    date_count = rollup.call_counts(df, "Date")
+    st.write(date_count)
 # Streamlit UI
 st.title("CHAI Data Management App")
 
@@ -678,9 +513,7 @@ elif choice == "SQL to Excel by Date":
     end_date = st.text_input("Enter End Date (YYYY-MM-DD)")
     if st.button("Export SQL Data"):
         sql_to_excel_datewise(start_date, end_date)
-elif choice=="Upload File(-)":
-    uploaded_file()
-elif choice=="Upload File(/)":
-    uploaded_fileS()
+elif choice in ("Upload File(-)", "Upload File(/)"):
+    uploaded_file(UPLOAD_DATE_FORMATS[choice])
 elif choice=="Export to SQL":
     export_to_sql()
\ No newline at end of file
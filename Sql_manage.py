@@ -1,7 +1,11 @@
 import streamlit as st
 import sqlite3
+import db
 import pandas as pd
+import sister_search
+import snapshot
 import os
+import shutil
 from datetime import datetime
 from pathlib import Path
 import tempfile
@@ -30,15 +34,15 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 def create_connection(db_path):
-    """Create a database connection with error handling"""
+    """Create a connection to the chosen (or uploaded) database with error handling"""
     try:
-        conn = sqlite3.connect(db_path)
+        conn = db.connect_external(db_path)
         return conn, None
     except sqlite3.Error as e:
         return None, f"Error connecting to database: {str(e)}"
 
 def get_db_tables(db_path):
-    """Get all table names from the database"""
+    """Get all table and view names (e.g. daily_calls) from the database"""
     conn, error = create_connection(db_path)
     if error:
         return [], error
@@ -48,7 +52,7 @@ def get_db_tables(db_path):
         cursor.execute("""
             SELECT name 
             FROM sqlite_master 
-            WHERE type='table'
+            WHERE type IN ('table', 'view')
             ORDER BY name;
         """)
         tables = [table[0] for table in cursor.fetchall()]
@@ -68,7 +72,7 @@ def get_table_info(db_path, table_name):
     try:
         cursor = conn.cursor()
         # Safely format table name to prevent SQL injection
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table_name,))
+        cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view') AND name=?", (table_name,))
         if not cursor.fetchone():
             return None, None, f"Table '{table_name}' does not exist"
         
@@ -85,9 +89,28 @@ def get_table_info(db_path, table_name):
         if conn:
             conn.close()
 
-def execute_sql_query(db_path, query):
+def repair_rebuilt_table(conn, table_name):
+    """
+    Put back what rebuilding a table with CREATE ... AS SELECT, DROP and RENAME
+    loses: for sisters, the search index triggers, and the index itself, whose
+    rowids no longer match. Databases without the index are left as they are.
+    """
+    if table_name != "sisters":
+        return
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (sister_search.FTS_TABLE,)).fetchone():
+        if not sister_search.ensure_sister_index(conn):
+            sister_search.rebuild(conn)
+
+def create_snapshot_connection(db_path):
+    """Read-only connection to the periodically refreshed snapshot of the database"""
+    try:
+        return snapshot.connect(db_path), None
+    except sqlite3.Error as e:
+        return None, f"Error opening snapshot: {str(e)}"
+
+def execute_sql_query(db_path, query, use_snapshot=False):
     """Execute SQL query and return results as a pandas DataFrame"""
-    conn, error = create_connection(db_path)
+    conn, error = create_snapshot_connection(db_path) if use_snapshot else create_connection(db_path)
     if error:
         return None, error
     
@@ -276,10 +299,10 @@ def db_command():
             
             if uploaded_file:
                 if st.session_state.temp_db_path:
-                    try:
-                        os.remove(st.session_state.temp_db_path)
-                    except:
-                        pass
+                    # Close pooled connections first, or they keep the deleted file open
+                    db.discard(st.session_state.temp_db_path)
+                    snapshot.discard(st.session_state.temp_db_path)
+                    shutil.rmtree(os.path.dirname(st.session_state.temp_db_path), ignore_errors=True)
                 
                 temp_dir = tempfile.mkdtemp()
                 temp_path = os.path.join(temp_dir, "temp_db.db")
@@ -544,7 +567,7 @@ def db_command():
                         if confirm_drop:
                             if st.button("🚮 Drop Column", type="primary"):
                                 try:
-                                    conn = sqlite3.connect(db_path)
+                                    conn = db.connect_external(db_path)
                                     cursor = conn.cursor()
                                     
                                     # Get all columns except the one to drop
@@ -564,6 +587,7 @@ def db_command():
                                     
                                     # Rename temp table to original
                                     cursor.execute(f"ALTER TABLE {selected_table}_temp RENAME TO {selected_table}")
+                                    repair_rebuilt_table(conn, selected_table)
                                     
                                     conn.commit()
                                     conn.close()
@@ -592,7 +616,7 @@ def db_command():
                         
                         if st.button("🔄 Rename Column", type="primary"):
                             try:
-                                conn = sqlite3.connect(db_path)
+                                conn = db.connect_external(db_path)
                                 cursor = conn.cursor()
                                 
                                 # Create new table with renamed column
@@ -613,6 +637,7 @@ def db_command():
                                 
                                 # Rename temp table to original
                                 cursor.execute(f"ALTER TABLE {selected_table}_temp RENAME TO {selected_table}")
+                                repair_rebuilt_table(conn, selected_table)
                                 
                                 conn.commit()
                                 conn.close()
@@ -639,7 +664,7 @@ def db_command():
                         
                         if st.button("🔄 Modify Column", type="primary"):
                             try:
-                                conn = sqlite3.connect(db_path)
+                                conn = db.connect_external(db_path)
                                 cursor = conn.cursor()
                                 
                                 # Add new column
@@ -667,6 +692,7 @@ def db_command():
                                 
                                 # Rename temp table to original
                                 cursor.execute(f"ALTER TABLE {selected_table}_temp RENAME TO {selected_table}")
+                                repair_rebuilt_table(conn, selected_table)
                                 
                                 conn.commit()
                                 conn.close()
@@ -715,10 +741,17 @@ def db_command():
                     height=150
                 )
                 
+                # Heavy analyst queries go to a copy so they never slow down ingestion or the dashboards
+                use_snapshot = st.checkbox(
+                    "📸 Run on read-only snapshot",
+                    value=True,
+                    help=f"A copy refreshed when older than {snapshot.MAX_AGE_SECONDS // 60} minutes; untick to query (or change) the live database"
+                )
+                
                 if st.button("🔄 Execute Query", type="primary"):
                     if query.strip():
                         with st.spinner("🔄 Executing query..."):
-                            results, error = execute_sql_query(db_path, query)
+                            results, error = execute_sql_query(db_path, query, use_snapshot)
                             
                             if error:
                                 st.error(f"❌ Query Error: {error}")
@@ -0,0 +1,270 @@
+import argparse
+import os
+import data_cache
+import db
+from datetime import datetime, date
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import ingest
+import rollup
+import star
+
+ARCHIVE_DIR = os.path.join("archive", "daily_calls")
+STATE_TABLE = "archive_months"
+COMPRESSION = "zstd"
+ARROW_TYPES = {"INTEGER": pa.int64(), "REAL": pa.float64()}  # everything else is stored as text
+# Partition keys get their own names: daily_calls already has year and month columns
+PARTITION_FIELDS = [pa.field("call_year", pa.int16()), pa.field("call_month", pa.int8())]
+PARTITIONING = ds.partitioning(pa.schema(PARTITION_FIELDS), flavor="hive")
+
+
+def create_state_table(conn):
+    # dirty: 0 = archive up to date, 1 = changed since last export, 2 = being exported
+    # cold: 1 = the month's rows were moved out of SQLite and live only in the archive
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+            month TEXT PRIMARY KEY,
+            rows INTEGER,
+            exported_at TEXT,
+            dirty INTEGER,
+            cold INTEGER DEFAULT 0
+        )
+    """)
+    if "cold" not in ingest.table_columns(conn, STATE_TABLE):
+        conn.execute(f"ALTER TABLE {STATE_TABLE} ADD COLUMN cold INTEGER DEFAULT 0")
+
+
+def mark_dirty(conn, days):
+    """Flag the months of the given YYYY-MM-DD days for re-export; runs in the caller's transaction"""
+    months = sorted({d[:7] for d in days if d})
+    if not months:
+        return
+    create_state_table(conn)
+    conn.executemany(
+        f"INSERT INTO {STATE_TABLE} (month, dirty) VALUES (?, 1) ON CONFLICT(month) DO UPDATE SET dirty = 1",
+        [(m,) for m in months],
+    )
+
+
+def mark_dirty_sql(day):
+    """Statement flagging the month of the SQL expression day (e.g. OLD."Date") for re-export, for triggers"""
+    return f"""
+        INSERT INTO {STATE_TABLE} (month, dirty) SELECT substr({day}, 1, 7), 1 WHERE {day} IS NOT NULL
+        ON CONFLICT(month) DO UPDATE SET dirty = 1
+    """
+
+
+def month_range(start_date, end_date):
+    """YYYY-MM strings covering two YYYY-MM-DD dates"""
+    months = []
+    year, month = int(start_date[:4]), int(start_date[5:7])
+    while f"{year:04d}-{month:02d}" <= end_date[:7]:
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def partition_dir(month, root=ARCHIVE_DIR):
+    return os.path.join(root, f"call_year={int(month[:4])}", f"call_month={int(month[5:7])}")
+
+
+def arrow_schema(conn):
+    """Parquet schema matching the declared types of daily_calls, so every partition agrees"""
+    types = ingest.calls_column_types(conn)
+    return pa.schema([(name, ARROW_TYPES.get(types.get(name), pa.string()))
+                      for name in ingest.table_columns(conn, ingest.CALLS_TABLE)])
+
+
+def export_month(conn, month, root=ARCHIVE_DIR):
+    """Rewrite one month's partition from daily_calls; returns the rows written"""
+    df = pd.read_sql_query(
+        f'SELECT * FROM {ingest.quote(ingest.CALLS_TABLE)} WHERE "Date" >= ? AND "Date" <= ?',
+        conn, params=(f"{month}-01", f"{month}-31"))
+    path = partition_dir(month, root)
+    os.makedirs(path, exist_ok=True)
+    target = os.path.join(path, "part-0.parquet")
+    if df.empty:
+        if os.path.exists(target):
+            os.remove(target)
+        return 0
+    table = pa.Table.from_pandas(df, schema=arrow_schema(conn), preserve_index=False)
+    # Write beside the old file and swap, so readers never see half a partition
+    pq.write_table(table, target + ".tmp", compression=COMPRESSION)
+    os.replace(target + ".tmp", target)
+    return len(df)
+
+
+def sync(db_path="chai.db", root=ARCHIVE_DIR, full=False, on_month=None):
+    """
+    Mirror daily_calls into the Parquet archive. Months changed by ingestion
+    since the last run (or never exported) are rewritten; full=True rewrites
+    every month. Returns the months exported.
+    """
+    conn = ingest.connect(db_path)
+    try:
+        create_state_table(conn)
+        # Months already in the database but unknown to the archive (e.g. loaded before it existed)
+        rollup.create_rollup_table(conn)
+        days = [row[0] for row in conn.execute(f'SELECT DISTINCT "Date" FROM {rollup.ROLLUP_TABLE}')]
+        conn.execute("BEGIN IMMEDIATE")
+        known = {row[0] for row in conn.execute(f"SELECT month FROM {STATE_TABLE}")}
+        mark_dirty(conn, [d for d in days if d and d[:7] not in known])
+        if full:
+            # Cold months exist only in the archive; exporting them from SQLite would empty them
+            conn.execute(f"UPDATE {STATE_TABLE} SET dirty = 1 WHERE cold = 0")
+        conn.commit()
+
+        months = [row[0] for row in conn.execute(f"SELECT month FROM {STATE_TABLE} WHERE dirty = 1 ORDER BY month")]
+        for month in months:
+            conn.execute(f"UPDATE {STATE_TABLE} SET dirty = 2 WHERE month = ?", (month,))
+            conn.commit()
+            try:
+                rows = export_month(conn, month, root)
+            except Exception:
+                conn.execute(f"UPDATE {STATE_TABLE} SET dirty = 1 WHERE month = ?", (month,))
+                conn.commit()
+                raise
+            # A load that lands mid-export sets dirty back to 1, so the month is redone next run
+            conn.execute(
+                f"UPDATE {STATE_TABLE} SET rows = ?, exported_at = ?, dirty = 0 WHERE month = ? AND dirty = 2",
+                (rows, datetime.now().isoformat(timespec="seconds"), month),
+            )
+            conn.commit()
+            if on_month:
+                on_month(month, rows)
+    finally:
+        conn.close()
+    return months
+
+
+def clean_months(conn, months):
+    create_state_table(conn)
+    placeholders = ", ".join("?" * len(months))
+    return {row[0] for row in conn.execute(
+        f"SELECT month FROM {STATE_TABLE} WHERE dirty = 0 AND month IN ({placeholders})", months)}
+
+
+def cold_months(conn):
+    create_state_table(conn)
+    return {row[0] for row in conn.execute(f"SELECT month FROM {STATE_TABLE} WHERE cold = 1")}
+
+
+def month_rows(conn, month):
+    return conn.execute(
+        f'SELECT COUNT(*) FROM {ingest.quote(ingest.CALLS_TABLE)} WHERE "Date" >= ? AND "Date" <= ?',
+        (f"{month}-01", f"{month}-31")).fetchone()[0]
+
+
+def freeze(conn, month, root=ARCHIVE_DIR):
+    """
+    Delete an exported month from call_facts, leaving it only in the archive.
+    Runs in the caller's transaction; does nothing (returns 0) unless the
+    partition is up to date and holds exactly the rows SQLite has.
+    """
+    create_state_table(conn)
+    row = conn.execute(f"SELECT rows, dirty, cold FROM {STATE_TABLE} WHERE month = ?", (month,)).fetchone()
+    if row is None or row[1] != 0 or row[2] != 0:
+        return 0
+    target = os.path.join(partition_dir(month, root), "part-0.parquet")
+    if not os.path.exists(target):
+        return 0
+    rows = month_rows(conn, month)
+    if rows == 0 or pq.ParquetFile(target).metadata.num_rows != rows or row[0] != rows:
+        return 0
+    # The rollup keeps its counts for these days; only the raw rows leave
+    conn.execute(f'DELETE FROM {star.FACT_TABLE} WHERE "Date" >= ? AND "Date" <= ?', (f"{month}-01", f"{month}-31"))
+    conn.execute(f"UPDATE {STATE_TABLE} SET cold = 1 WHERE month = ?", (month,))
+    return rows
+
+
+def thaw(conn, days, root=ARCHIVE_DIR):
+    """
+    Put the archived rows of any cold month among days back into call_facts
+    (rows already there win), so a late load into an old month is counted
+    against the whole month. Runs in the caller's transaction; returns the
+    months thawed.
+    """
+    months = sorted({d[:7] for d in days if d} & cold_months(conn))
+    for month in months:
+        target = os.path.join(partition_dir(month, root), "part-0.parquet")
+        df = pq.read_table(target).to_pandas() if os.path.exists(target) else pd.DataFrame()
+        if not df.empty:
+            columns = list(df.columns)
+            ingest.ensure_calls_table(conn, columns)
+            conn.execute("DROP TABLE IF EXISTS temp.thaw_calls")
+            conn.execute(f"CREATE TEMP TABLE thaw_calls ({', '.join(ingest.quote(c) for c in columns)})")
+            conn.executemany(f"INSERT INTO temp.thaw_calls VALUES ({', '.join(['?'] * len(columns))})",
+                             ingest.frame_rows(df))
+            star.insert_dimensions(conn, "temp.thaw_calls", columns)
+            fact_cols, select = star.fact_select("temp.thaw_calls", columns)
+            conn.execute(f"""
+                INSERT INTO {star.FACT_TABLE} ({', '.join(ingest.quote(c) for c in fact_cols)})
+                {select} WHERE true
+                ON CONFLICT({ingest.quote(ingest.KEY_COLUMN)}) DO NOTHING
+            """)
+            conn.execute("DROP TABLE temp.thaw_calls")
+        conn.execute(f"UPDATE {STATE_TABLE} SET cold = 0, dirty = 1 WHERE month = ?", (month,))
+    return months
+
+
+@data_cache.cached
+def read_calls(start_date, end_date=None, columns=None, region=None, db_path="chai.db", root=ARCHIVE_DIR):
+    """
+    daily_calls rows between two YYYY-MM-DD dates, like SELECT * FROM daily_calls.
+    Up-to-date months come from the Parquet archive, reading only their
+    partitions and the requested columns; the rest come from SQLite.
+    """
+    end_date = end_date or date.today().isoformat()
+    months = month_range(start_date, end_date)
+    conn = db.get_connection(db_path)
+    try:
+        archived = clean_months(conn, months) if months else set()
+        live = [m for m in months if m not in archived]
+        schema = arrow_schema(conn)
+        wanted = columns or schema.names
+        frames = []
+
+        if archived and os.path.isdir(root):
+            dataset = ds.dataset(root, format="parquet", partitioning=PARTITIONING,
+                                 schema=pa.schema(list(schema) + PARTITION_FIELDS))
+            # Partition filters prune whole directories before any file is opened
+            in_months = None
+            for m in sorted(archived):
+                one = (ds.field("call_year") == int(m[:4])) & (ds.field("call_month") == int(m[5:7]))
+                in_months = one if in_months is None else in_months | one
+            condition = in_months & (ds.field("Date") >= start_date) & (ds.field("Date") <= end_date)
+            if region:
+                condition = condition & (ds.field("RegionalUnit") == region)
+            frames.append(dataset.to_table(columns=wanted, filter=condition).to_pandas())
+
+        for m in live:
+            clauses = ['"Date" >= ?', '"Date" <= ?']
+            params = [max(start_date, f"{m}-01"), min(end_date, f"{m}-31")]
+            if region:
+                clauses.append("RegionalUnit = ?")
+                params.append(region)
+            frames.append(pd.read_sql_query(
+                f"SELECT {', '.join(ingest.quote(c) for c in wanted)} FROM {ingest.quote(ingest.CALLS_TABLE)} "
+                f"WHERE {' AND '.join(clauses)}", conn, params=params))
+    finally:
+        conn.close()
+
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame(columns=wanted)
+    df = pd.concat(frames, ignore_index=True)
+    if "Date" in df.columns:
+        df = df.sort_values("Date", kind="stable", ignore_index=True)
+    return df
+
+
+if __name__ == "__main__":
+    # Maintenance job, e.g. nightly `python archive.py` (or --full after editing old rows by hand)
+    parser = argparse.ArgumentParser(description="Mirror daily_calls into a Parquet archive partitioned by year/month")
+    parser.add_argument("--db", default=ingest.DB_PATH)
+    parser.add_argument("--dir", default=ARCHIVE_DIR)
+    parser.add_argument("--full", action="store_true", help="rewrite every month")
+    args = parser.parse_args()
+    sync(args.db, args.dir, args.full, on_month=lambda month, rows: print(f"{month}: {rows} rows"))
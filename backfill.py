@@ -0,0 +1,148 @@
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, date, timedelta
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import ingest
+import ledger
+
+API_BASE = "https://champs.billionlives.in:8000/consultation_api"
+CHECKPOINT_TABLE = "ingest_checkpoints"
+DATE_FORMAT = "%d-%m-%Y"  # format expected by getCallLogsCSV
+TIMEOUT = (10, 120)  # (connect, read) seconds
+
+_local = threading.local()
+
+
+def make_session(retries=3, backoff=0.5, pool_size=4):
+    """Keep-alive session that retries failed GETs with exponential backoff"""
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET"],
+    )
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_size, pool_maxsize=pool_size)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def thread_session(retries, backoff):
+    # One session per worker thread so each keeps its own connection alive
+    if getattr(_local, "session", None) is None:
+        _local.session = make_session(retries, backoff, pool_size=1)
+    return _local.session
+
+
+def create_checkpoint_table(conn):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CHECKPOINT_TABLE} (
+            day TEXT PRIMARY KEY,
+            rows INTEGER,
+            finished_at TEXT
+        )
+    """)
+
+
+def completed_days(conn):
+    create_checkpoint_table(conn)
+    return {row[0] for row in conn.execute(f"SELECT day FROM {CHECKPOINT_TABLE}")}
+
+
+def mark_completed(conn, days, rows):
+    # Today's log is still growing, so never checkpoint it as finished
+    today = date.today().isoformat()
+    finished_at = datetime.now().isoformat(timespec="seconds")
+    conn.executemany(
+        f"INSERT OR REPLACE INTO {CHECKPOINT_TABLE} (day, rows, finished_at) VALUES (?, ?, ?)",
+        [(d.isoformat(), rows, finished_at) for d in days if d.isoformat() < today],
+    )
+
+
+def split_range(start, end, window_days=1, skip=()):
+    """
+    Split the inclusive date range into windows of at most window_days days.
+    Days in skip (ISO strings) are left out, and windows never span a skipped day.
+    """
+    windows, current = [], []
+    day = start
+    while day <= end:
+        if day.isoformat() in skip:
+            if current:
+                windows.append(current)
+            current = []
+        else:
+            current.append(day)
+            if len(current) == window_days:
+                windows.append(current)
+                current = []
+        day += timedelta(days=1)
+    if current:
+        windows.append(current)
+    return windows
+
+
+def fetch_window(days, base_url, retries, backoff):
+    """Download the call log CSV for one window; returns (raw bytes, seconds taken)"""
+    started = time.perf_counter()
+    session = thread_session(retries, backoff)
+    url = f"{base_url}/getCallLogsCSV"
+    params = {"startdate": days[0].strftime(DATE_FORMAT), "enddate": days[-1].strftime(DATE_FORMAT)}
+    response = session.get(url, params=params, timeout=TIMEOUT)
+    response.raise_for_status()
+    return response.content, time.perf_counter() - started
+
+
+def backfill(start_date, end_date, window_days=1, workers=4, base_url=API_BASE,
+             db_path=ingest.DB_PATH, retries=3, backoff=0.5, on_window=None):
+    """
+    Fetch getCallLogsCSV for start_date..end_date (DD-MM-YYYY strings) in parallel
+    windows and upsert each into daily_calls. Days already recorded in the
+    checkpoint table are skipped, so an interrupted backfill resumes where it
+    stopped. on_window(done, total, days, rows, error) reports each finished window.
+    """
+    start = datetime.strptime(start_date, DATE_FORMAT).date()
+    end = datetime.strptime(end_date, DATE_FORMAT).date()
+    summary = {"windows": 0, "resumed_days": 0, "rows": 0,
+               "inserted": 0, "updated": 0, "skipped": 0, "failed": []}
+
+    conn = ingest.connect(db_path)
+    try:
+        done = completed_days(conn)
+        conn.commit()
+        windows = split_range(start, end, window_days, skip=done)
+        summary["windows"] = len(windows)
+        summary["resumed_days"] = (end - start).days + 1 - sum(len(w) for w in windows)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(fetch_window, w, base_url, retries, backoff): w for w in windows}
+            for finished, future in enumerate(as_completed(futures), start=1):
+                days = futures[future]
+                rows, error = 0, None
+                try:
+                    with ledger.Batch(f"backfill:{days[0]}..{days[-1]}", db_path) as batch:
+                        content, batch.timings["download"] = future.result()
+                        batch.bytes = len(content)
+                        # Writes stay on this thread; each window and its checkpoint publish together
+                        batch.rows, batch.counts = ingest.load_calls(
+                            conn, io.BytesIO(content), timings=batch.timings, date_format=ingest.API_DATE_FORMAT,
+                            before_commit=lambda c, n, days=days: mark_completed(c, days, n))
+                    rows, counts = batch.rows, batch.counts
+                    summary["rows"] += rows
+                    for k in counts:
+                        summary[k] += counts[k]
+                except Exception as e:
+                    if conn.in_transaction:
+                        conn.rollback()
+                    error = str(e)
+                    summary["failed"].append((days[0].isoformat(), days[-1].isoformat(), error))
+                if on_window:
+                    on_window(finished, len(windows), days, rows, error)
+    finally:
+        conn.close()
+    return summary
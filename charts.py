@@ -0,0 +1,115 @@
+import hashlib
+import io
+import pandas as pd
+import plotly.graph_objects as go
+import seaborn as sns
+import streamlit as st
+from matplotlib.figure import Figure
+import data_cache
+
+FIGSIZE = (10, 6)
+INTERACTIVE = "Interactive"
+IMAGE = "Image"
+WEBGL_MIN_POINTS = 60  # longer series are drawn as WebGL scatter traces instead of SVG bars
+BAR_HEIGHT = 28  # pixels per bar in interactive charts
+# Rendered charts shared by every session; a chart is redrawn only when its data or labels change
+_cache = data_cache.LRUCache(max_entries=128, max_bytes=64 * 1024 * 1024)
+
+
+def chart_key(counts, *labels):
+    """Hash of a Series' index and values plus the chart labels"""
+    digest = hashlib.sha1(pd.util.hash_pandas_object(counts, index=True).to_numpy().tobytes())
+    digest.update(repr((counts.name, labels)).encode())
+    return digest.hexdigest()
+
+
+def render_bar_chart(counts, title, xlabel, ylabel=None):
+    """
+    Horizontal seaborn bar chart of counts with value labels, as PNG bytes.
+    Uses a bare Figure rather than pyplot, so nothing is kept in pyplot's
+    global figure list and the figure is freed as soon as it is saved.
+    """
+    fig = Figure(figsize=FIGSIZE)
+    try:
+        ax = fig.subplots()
+        sns.barplot(x=counts.values, y=counts.index, ax=ax)
+        ax.set_title(title)
+        ax.set_xlabel(xlabel)
+        if ylabel:
+            ax.set_ylabel(ylabel)
+        if ax.containers:
+            ax.bar_label(ax.containers[0], labels=[f'{v}' for v in counts.values], padding=3)
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format="png")
+        return buffer.getvalue()
+    finally:
+        fig.clear()
+
+
+def bar_chart_png(counts, title, xlabel, ylabel=None):
+    """
+    PNG of the bar chart for counts, drawn once per distinct input. The same
+    bytes serve st.image and the "Download Graph" button, so a rerun with
+    unchanged data draws nothing.
+    """
+    key = chart_key(counts, title, xlabel, ylabel)
+    hit, png = _cache.get(key)
+    if not hit:
+        png = render_bar_chart(counts, title, xlabel, ylabel)
+        _cache.put(key, png)
+    return png
+
+
+def is_date_index(counts):
+    """True if every label of counts is a YYYY-MM-DD date (Date panels)"""
+    labels = counts.index.astype(str)
+    return len(labels) > 0 and bool(labels.str.fullmatch(r"\d{4}-\d{2}-\d{2}").all())
+
+
+def bar_chart_figure(counts, title, xlabel, ylabel=None):
+    """
+    Plotly version of the bar chart for the browser to draw. The figure holds
+    just the labels and counts of the series. Long series become a WebGL
+    scatter: a line over a date axis for dates, markers for anything else.
+    """
+    labels = counts.index.astype(str).tolist()
+    values = counts.to_numpy().tolist()
+    fig = go.Figure()
+    if len(values) >= WEBGL_MIN_POINTS and is_date_index(counts):
+        order = pd.to_datetime(pd.Series(labels)).argsort()
+        fig.add_trace(go.Scattergl(x=[labels[i] for i in order], y=[values[i] for i in order],
+                                   mode="lines+markers", name=xlabel))
+        fig.update_layout(xaxis=dict(type="date", title=ylabel or ""), yaxis=dict(title=xlabel))
+    else:
+        if len(values) >= WEBGL_MIN_POINTS:
+            # Too many labels to read at once; zoom in with the toolbar
+            fig.add_trace(go.Scattergl(x=values, y=labels, mode="markers"))
+            height = 600
+        else:
+            fig.add_trace(go.Bar(x=values, y=labels, orientation="h", text=values,
+                                 textposition="outside", cliponaxis=False))
+            height = max(400, BAR_HEIGHT * len(labels) + 120)
+        # Largest first from the top, as in the image charts
+        fig.update_layout(xaxis=dict(title=xlabel), height=height,
+                          yaxis=dict(title=ylabel or "", type="category", autorange="reversed"))
+    fig.update_layout(title=title, showlegend=False, margin=dict(l=10, r=10, t=50, b=10))
+    return fig
+
+
+def show_bar_chart(counts, title, xlabel, ylabel=None, file_name="chart", interactive=False):
+    """
+    Show the bar chart in the current Streamlit container. Interactive charts
+    are drawn by the browser and saved as PNG from the chart toolbar, so they
+    return None; image mode returns the cached PNG bytes for the download button.
+    """
+    if interactive:
+        st.plotly_chart(bar_chart_figure(counts, title, xlabel, ylabel), use_container_width=True,
+                        config={"displaylogo": False, "toImageButtonOptions": {"filename": file_name}})
+        return None
+    png = bar_chart_png(counts, title, xlabel, ylabel)
+    st.image(png)
+    return png
+
+
+def stats():
+    return _cache.stats()
@@ -0,0 +1,156 @@
+import functools
+import inspect
+import sys
+import threading
+from collections import OrderedDict
+import pandas as pd
+import db
+
+GENERATION_TABLE = "data_generation"
+MAX_ENTRIES = 1024  # room for every regional unit's precomputed dashboards (region_cache) and the admins' queries
+MAX_BYTES = 256 * 1024 * 1024  # results held in memory across all sessions of the server
+
+
+def create_generation_table(conn):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {GENERATION_TABLE} (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            generation INTEGER
+        )
+    """)
+
+
+# Also run by the daily_calls triggers (see star.create_triggers)
+BUMP_SQL = f"""
+    INSERT INTO {GENERATION_TABLE} (id, generation) VALUES (0, 1)
+    ON CONFLICT(id) DO UPDATE SET generation = generation + 1
+"""
+
+
+def bump_generation(conn):
+    """Mark cached results of this database as stale; runs in the caller's transaction"""
+    create_generation_table(conn)
+    conn.execute(BUMP_SQL)
+
+
+def generation(db_path=db.DB_PATH):
+    """Counter bumped by every write that changes dashboard data (kept in the database, so other processes see it)"""
+    conn = db.get_connection(db_path)
+    try:
+        create_generation_table(conn)
+        row = conn.execute(f"SELECT generation FROM {GENERATION_TABLE} WHERE id = 0").fetchone()
+        conn.commit()
+    finally:
+        conn.close()
+    return row[0] if row else 0
+
+
+def result_size(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(result_size(v) for v in value.values())
+    if isinstance(value, list):
+        return sys.getsizeof(value) + sum(sys.getsizeof(v) for v in value)
+    return sys.getsizeof(value)
+
+
+def copy_result(value):
+    # Callers may add or change columns; they must not change the cached copy
+    if isinstance(value, dict):
+        return {k: copy_result(v) for k, v in value.items()}
+    if isinstance(value, (pd.DataFrame, pd.Series, list)):
+        return value.copy()
+    return value
+
+
+class LRUCache:
+    """Thread-safe least-recently-used cache bounded by entry count and total size"""
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (value, size)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """(True, value) on a hit, (False, None) on a miss"""
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return True, self.entries[key][0]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        size = result_size(value)
+        if size > self.max_bytes:
+            return  # would evict everything else for a single result
+        with self.lock:
+            if key in self.entries:
+                self.bytes -= self.entries.pop(key)[1]
+            self.entries[key] = (value, size)
+            self.bytes += size
+            while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+                self.bytes -= self.entries.popitem(last=False)[1][1]
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+            }
+
+
+_cache = LRUCache()
+
+
+def cached(func):
+    """
+    Cache func's results per arguments and data generation of its db_path
+    argument (chai.db by default). Shared by every Streamlit rerun and session
+    in the process; a load that changes data bumps the generation, so the next
+    call misses and queries again. Entries of old generations age out of the LRU.
+    """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = (func.__module__, func.__qualname__, repr(bound.arguments),
+               generation(bound.arguments.get("db_path", db.DB_PATH)))
+        hit, value = _cache.get(key)
+        if not hit:
+            value = func(*args, **kwargs)
+            _cache.put(key, value)
+        return copy_result(value)
+
+    return wrapper
+
+
+def stats():
+    """Hit/miss counters, entries and bytes held by the shared cache"""
+    return _cache.stats()
+
+
+def clear():
+    _cache.clear()
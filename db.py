@@ -0,0 +1,111 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+
+DB_PATH = "chai.db"
+BUSY_TIMEOUT_MS = 30000
+CACHED_STATEMENTS = 256  # prepared statements kept per connection
+MAX_IDLE = 8  # idle connections kept per database file
+MAX_PATHS = 4  # database files with idle connections; the least recently used one's are closed
+
+# Applied once when a connection to one of the app's own databases is opened. WAL
+# sticks to the file, so databases picked or uploaded in the SQL tools never get it.
+OWNED_PRAGMAS = [
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",  # safe with WAL, skips an fsync per commit
+]
+# Applied to every connection when it is opened; it then keeps them for its lifetime
+PRAGMAS = [
+    f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}",
+    "PRAGMA mmap_size = 268435456",  # 256 MB of the file read through the OS page cache
+    "PRAGMA cache_size = -32768",  # 32 MB page cache per connection
+    "PRAGMA temp_store = MEMORY",
+]
+
+_idle = OrderedDict()  # db_path -> idle connections, least recently used path first
+_lock = threading.Lock()
+
+
+class PooledConnection(sqlite3.Connection):
+    """
+    sqlite3 connection whose close() hands it back to the pool instead of
+    closing it, so existing `conn = ...; ...; conn.close()` code reuses warm
+    connections (page cache, mmap, prepared statements) without changes.
+    """
+
+    def close(self):
+        if getattr(self, "_pooled", False):
+            return  # already back in the pool
+        if self.in_transaction:
+            self.rollback()  # same as a real close would do
+        evicted = []
+        with _lock:
+            idle = _idle.setdefault(self.db_path, [])
+            _idle.move_to_end(self.db_path)
+            if len(idle) < MAX_IDLE:
+                self._pooled = True
+                idle.append(self)
+                while len(_idle) > MAX_PATHS:
+                    evicted += _idle.popitem(last=False)[1]
+        for conn in evicted:
+            conn.discard()
+        if not getattr(self, "_pooled", False):
+            super().close()
+
+    def discard(self):
+        self._pooled = True
+        super().close()
+
+
+def open_connection(db_path, owned=True):
+    # check_same_thread=False: a connection is only ever checked out to one
+    # thread at a time, but the next user of it may be a different thread
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False,
+                           cached_statements=CACHED_STATEMENTS,
+                           factory=PooledConnection if owned else sqlite3.Connection)
+    if owned:
+        conn.db_path = db_path
+    for pragma in (OWNED_PRAGMAS if owned else []) + PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def get_connection(db_path=DB_PATH):
+    """
+    A tuned connection to db_path for the calling thread's exclusive use until
+    it calls close(). Idle connections are reused; a new one is opened if none
+    is free.
+    """
+    with _lock:
+        idle = _idle.get(db_path)
+        conn = idle.pop() if idle else None
+    if conn is None:
+        return open_connection(db_path)
+    conn._pooled = False
+    return conn
+
+
+def connect_external(db_path):
+    """
+    Unpooled connection to a database the app doesn't own (one picked or
+    uploaded in the SQL tools): same tuning, but its journal mode is left as
+    it is and close() really closes it.
+    """
+    return open_connection(db_path, owned=False)
+
+
+def discard(db_path):
+    """Really close db_path's idle connections (e.g. before deleting or replacing the file)"""
+    with _lock:
+        conns = _idle.pop(db_path, [])
+    for conn in conns:
+        conn.discard()
+
+
+def close_all():
+    """Really close every idle connection (e.g. before replacing or deleting the file)"""
+    with _lock:
+        conns = [c for idle in _idle.values() for c in idle]
+        _idle.clear()
+    for conn in conns:
+        conn.discard()
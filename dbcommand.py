@@ -1,37 +1,33 @@
-import sqlite3
+import db
 import pandas as pd
+import snapshot
 import streamlit as st
 import os
 
 
-def get_tables(db_name):
+def get_tables(conn):
     try:
-        conn = sqlite3.connect(db_name)
         c = conn.cursor()
-        c.execute("SELECT name FROM sqlite_master WHERE type='table';")
-        tables = [row[0] for row in c.fetchall()]
-        conn.close()
-        return tables
+        c.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view');")
+        return [row[0] for row in c.fetchall()]
     except Exception as e:
         st.error(f"Error fetching tables: {e}")
         return []
 
-def get_table_info(db_name, table_name):
+def get_table_info(conn, table_name):
     try:
-        conn = sqlite3.connect(db_name)
         c = conn.cursor()
         c.execute(f"PRAGMA table_info({table_name});")
         structure = c.fetchall()
         c.execute(f"SELECT COUNT(*) FROM {table_name};")
         record_count = c.fetchone()[0]
-        conn.close()
         return structure, record_count
     except Exception as e:
         st.error(f"Error fetching table info: {e}")
         return [], 0
 
 def execute_and_export(q, db_name, table_name):
-    conn = sqlite3.connect(db_name)
+    conn = db.connect_external(db_name)
     c = conn.cursor()
     try:
         # Execute the query
@@ -55,53 +51,65 @@ def query_executor():
     # Select database file
         db_files = [f for f in os.listdir() if f.endswith(".db")]
         db_name = st.selectbox("Select Database", db_files)
-        conn = sqlite3.connect(db_name)
-        c = conn.cursor()
-        # Get tables from the selected database
-        if db_name:
-            tables = get_tables(db_name)
-            if tables:
-                table_name = st.selectbox("Select Table", tables)
-                if table_name:
-                    structure, record_count = get_table_info(db_name, table_name)
-                    st.subheader("Table Structure")
-                    if structure:
-                        structure_df = pd.DataFrame(structure, columns=["Column ID", "Name", "Type", "Not Null", "Default Value", "Primary Key"])
-                        st.dataframe(structure_df)
-                    else:
-                        st.write("No structure available.")                    
-                st.subheader("Number of Records")
-                st.write(record_count)
-                q=f"select * from {table_name}"
-                df=pd.read_sql_query(q,conn)
-                csv_data=df.to_csv(index=False)
-                st.download_button(
-                    label="Download Table Data",
-                    data=csv_data,
-                    file_name=f"{table_name}.csv",
-                    mime="text/csv"
-                ) 
+        # SELECTs (and table downloads) on a copy never compete with ingestion or the dashboards
+        use_snapshot = st.checkbox("Run SELECTs on the read-only snapshot", value=True)
+        if use_snapshot and db_name:
+            if st.button("Refresh snapshot"):
+                snapshot.refresh(db_name)
+            conn = snapshot.connect(db_name)
+            st.caption(f"Snapshot taken {snapshot.snapshot_time(db_name):%Y-%m-%d %H:%M}; other commands run on the live database")
         else:
-            st.error("No tables found in the database.")
-
-    # User input for query
-    with col2:
-        
-        query = st.text_area("Enter SQL Query")
-
-        # Execute button
-        if st.button("Execute"):
-            if db_name and table_name and query.strip():
-                if not query.startswith('select'):
-                    execute_and_export(query, db_name, table_name)
-                else:
-                    df=pd.read_sql_query(query,conn)
+            conn = db.connect_external(db_name)
+    try:
+        with col1:
+            # Tables come from the same copy the SELECTs run on
+            if db_name:
+                tables = get_tables(conn)
+                if tables:
+                    table_name = st.selectbox("Select Table", tables)
+                    if table_name:
+                        structure, record_count = get_table_info(conn, table_name)
+                        st.subheader("Table Structure")
+                        if structure:
+                            structure_df = pd.DataFrame(structure, columns=["Column ID", "Name", "Type", "Not Null", "Default Value", "Primary Key"])
+                            st.dataframe(structure_df)
+                        else:
+                            st.write("No structure available.")                    
+                    st.subheader("Number of Records")
+                    st.write(record_count)
+                    q=f"select * from {table_name}"
+                    df=pd.read_sql_query(q,conn)
                     csv_data=df.to_csv(index=False)
                     st.download_button(
-                        label="Download Output Data",
+                        label="Download Table Data",
                         data=csv_data,
-                        file_name="output.csv",
+                        file_name=f"{table_name}.csv",
                         mime="text/csv"
                     ) 
             else:
-                st.error("Please select a database, table, and enter a valid query.")
\ No newline at end of file
+                st.error("No tables found in the database.")
+
+        # User input for query
+        with col2:
+        
+            query = st.text_area("Enter SQL Query")
+
+            # Execute button
+            if st.button("Execute"):
+                if db_name and table_name and query.strip():
+                    if not query.startswith('select'):
+                        execute_and_export(query, db_name, table_name)
+                    else:
+                        df=pd.read_sql_query(query,conn)
+                        csv_data=df.to_csv(index=False)
+                        st.download_button(
+                            label="Download Output Data",
+                            data=csv_data,
+                            file_name="output.csv",
+                            mime="text/csv"
+                        ) 
+                else:
+                    st.error("Please select a database, table, and enter a valid query.")
+    finally:
+        # Snapshot connections aren't pooled; an open one keeps reading a replaced snapshot file
+        conn.close()
@@ -0,0 +1,113 @@
+import gzip
+import io
+import os
+import tempfile
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import streamlit as st
+from openpyxl import Workbook
+
+CHUNK_ROWS = 50000  # rows serialised at a time
+SPOOL_BYTES = 32 * 1024 * 1024  # frames bigger than this in memory are written to a temp file
+EXCEL_MAX_ROWS = 1048576
+# Format -> (file extension, MIME type)
+FORMATS = {
+    "CSV": (".csv", "text/csv"),
+    "CSV (gzip)": (".csv.gz", "application/gzip"),
+    "Excel": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "Parquet": (".parquet", "application/vnd.apache.parquet"),
+}
+
+
+def chunks(df, rows=CHUNK_ROWS):
+    for start in range(0, len(df), rows):
+        yield df.iloc[start:start + rows]
+
+
+def write_csv(df, target, index):
+    for i, chunk in enumerate(chunks(df)):
+        target.write(chunk.to_csv(index=index, header=i == 0).encode("utf-8"))
+    if not len(df):
+        target.write(df.to_csv(index=index).encode("utf-8"))
+
+
+def write_excel(df, target, index):
+    if len(df) + 1 > EXCEL_MAX_ROWS:
+        raise ValueError(f"{len(df)} rows do not fit in one Excel sheet; choose CSV or Parquet")
+    # Write-only workbooks stream rows to the file instead of keeping every cell object
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("data")
+    frame = df.reset_index() if index else df
+    sheet.append([str(c) for c in frame.columns])
+    for chunk in chunks(frame):
+        # openpyxl only takes plain Python values; missing values become empty cells
+        for row in chunk.astype(object).where(chunk.notna(), None).itertuples(index=False, name=None):
+            sheet.append(row)
+    workbook.save(target)
+
+
+def write_parquet(df, target, index):
+    # Labels of pivot tables (months, dates) may not be strings; Parquet column names must be
+    frame = df.rename(columns=str)
+    # Types inferred from the whole frame, so a column that starts out empty still gets its type
+    schema = pa.Schema.from_pandas(frame, preserve_index=index)
+    with pq.ParquetWriter(target, schema, compression="zstd") as writer:
+        for chunk in chunks(frame):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=index))
+
+
+def export(df, fmt, index=True):
+    """
+    df (a DataFrame or Series) serialised as fmt (a FORMATS key), chunk by
+    chunk. Small results are built in memory; large ones in a temp file that
+    is unlinked once opened, so no single string of the whole export is ever
+    built. Returns a readable binary file positioned at the start.
+    """
+    if isinstance(df, pd.Series):
+        df = df.to_frame()
+    large = df.memory_usage(index=True, deep=True).sum() > SPOOL_BYTES
+    if large:
+        handle, path = tempfile.mkstemp(suffix=FORMATS[fmt][0])
+        target = os.fdopen(handle, "wb")
+    else:
+        target = io.BytesIO()
+    try:
+        if fmt == "CSV (gzip)":
+            with gzip.GzipFile(fileobj=target, mode="wb", compresslevel=6) as zipped:
+                write_csv(df, zipped, index)
+        elif fmt == "Excel":
+            write_excel(df, target, index)
+        elif fmt == "Parquet":
+            write_parquet(df, target, index)
+        else:
+            write_csv(df, target, index)
+        if not large:
+            target.seek(0)
+            return target
+        target.close()
+        result = open(path, "rb")
+    finally:
+        if large:
+            target.close()
+            os.remove(path)  # the open handle keeps the data readable until it is closed
+    return result
+
+
+def download_data(data, file_stem, fmt, key, label="Download Data", prepare="Prepare data", index=True):
+    """
+    Download button whose file is only built once the `prepare` checkbox is
+    ticked. data is a DataFrame or a function returning one (for results that
+    are only read when asked for).
+    """
+    if not st.checkbox(prepare, key=f"prepare_{key}"):
+        return
+    extension, mime = FORMATS[fmt]
+    try:
+        with st.spinner("Preparing download..."):
+            result = export(data() if callable(data) else data, fmt, index)
+    except ValueError as e:
+        st.error(str(e))
+        return
+    with result:
+        st.download_button(label=label, data=result, file_name=f"{file_stem}{extension}", mime=mime, key=key)
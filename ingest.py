@@ -0,0 +1,645 @@
+import csv
+import io
+import itertools
+import os
+import sqlite3
+import time
+import db
+import pandas as pd
+import ledger
+import rollup
+import star
+import archive
+import data_cache
+
+DB_PATH = "chai.db"
+CALLS_TABLE = "daily_calls"
+STAGING_TABLE = "temp.staging_calls"
+STAGED_FACTS = "temp.staging_facts"
+KEY_COLUMN = "Consultation ID"
+KEY_INDEX = "ux_daily_calls_consultation_id"
+CHUNK_ROWS = 5000
+BATCH_ROWS = 10000
+SAMPLE_ROWS = 500
+
+# Per-connection settings for bulk loads: fewer fsyncs and a bigger page cache. In WAL mode
+# NORMAL only syncs at checkpoints, and unlike OFF a power cut cannot corrupt the database.
+LOAD_PRAGMAS = [
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -65536",  # 64 MB
+    "PRAGMA temp_store = MEMORY",
+]
+
+
+# Declared types for daily_calls; columns not listed are created without a type
+CALL_TIMESTAMPS = ["CallStarttime", "appointmentCreatedTime", "appointmentScheduledTime",
+                   "appointmentStartTime", "appointmentEndTime"]
+CALL_FLAGS = ["smsSent", "EMAIL SENT"]
+CALL_PHONES = ["Mobile", "PatientPhoneNo", "doctorPhone"]
+# Read as text: pandas would make a chunk with one blank phone float ('9492199593.0')
+TEXT_COLUMNS = [KEY_COLUMN] + CALL_PHONES
+CALL_COLUMN_TYPES = {
+    "Consultation ID": "TEXT",
+    "Nurse Name": "TEXT",
+    "Mobile": "TEXT",
+    "PatientPhoneNo": "TEXT",
+    "doctorPhone": "TEXT",
+    "PatientAge": "REAL",  # years
+    "Date": "TEXT",  # YYYY-MM-DD
+    "Call Duration": "INTEGER",  # seconds
+    "day": "INTEGER",
+    "month": "TEXT",
+    "year": "INTEGER",
+    **{c: "TEXT" for c in CALL_TIMESTAMPS},  # YYYY-MM-DD HH:MM:SS
+    **{c: "INTEGER" for c in CALL_FLAGS},  # 1/0
+}
+# Columns normalise_types parses
+NORMALISED_COLUMNS = CALL_TIMESTAMPS + ["PatientAge", "Call Duration"] + CALL_FLAGS + CALL_PHONES
+REQUIRED_COLUMNS = [KEY_COLUMN, "Date", "Nurse Name", "RegionalUnit"]
+
+# Date layouts seen across the API, CSV exports and Excel sheets, for files whose
+# layout the caller doesn't know. A sample that fits more than one (e.g. every
+# day <= 12) is rejected rather than guessed; callers that know pass date_format.
+DATE_FORMATS = ["%d-%m-%Y", "%m-%d-%Y", "%Y-%m-%d",
+                "%m/%d/%Y", "%d/%m/%Y", "%Y/%m/%d", "%d.%m.%Y"]
+API_DATE_FORMAT = "%d-%m-%Y"  # getCallLogsCSV (downloads, poller, backfill)
+DATE_SAMPLE = 1000
+API_TIMESTAMP_FORMAT = "%B %d, %Y %I:%M %p"  # "February 10, 2025 10:17 AM"
+AGE_UNITS = {"Y": 1, "M": 1 / 12, "W": 1 / 52, "D": 1 / 365}
+
+
+def connect(db_path=DB_PATH):
+    """
+    Connection for ingestion from the shared pool (WAL, busy_timeout and the
+    other db.PRAGMAS). WAL is a persistent property of the database file, so
+    dashboard readers never block on (or see half of) a load.
+    """
+    return db.get_connection(db_path)
+
+
+def quote(name):
+    """Quote a column or table name for SQLite (names like "Nurse Name" have spaces)"""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def table_columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({quote(table)})")]
+
+
+def column_def(name, types):
+    kind = types.get(name, "")
+    return f"{quote(name)} {kind}".strip()
+
+
+def calls_column_types(conn):
+    """CALL_COLUMN_TYPES, plus the declared types of other daily_calls columns the API has added"""
+    types = {row[1]: row[2] for row in conn.execute(f"PRAGMA table_info({quote(CALLS_TABLE)})")}
+    types.update(CALL_COLUMN_TYPES)
+    return types
+
+
+def ensure_calls_table(conn, columns):
+    """
+    Create or extend the daily_calls layout for columns: dimension tables, the
+    call_facts table (unique Consultation ID) and the daily_calls view over them
+    """
+    star.ensure_layout(conn, columns)
+
+
+def recreate_calls_view(conn):
+    """Rebuild the daily_calls view and its triggers over call_facts, if there is one"""
+    if table_columns(conn, star.FACT_TABLE):
+        star.create_view(conn)
+
+
+def retype_calls_table(conn):
+    """
+    Give call_facts the CALL_COLUMN_TYPES declarations and parse the values
+    stored before they applied. Archived months are brought back first so
+    they are parsed too, and every partition is rewritten with the new types
+    on the next archive sync. Runs in the caller's transaction.
+    """
+    if not table_columns(conn, star.FACT_TABLE):
+        return
+    archive.thaw(conn, [f"{month}-01" for month in archive.cold_months(conn)])
+    star.retype_facts(conn)
+    star.normalise_facts(conn)
+    conn.execute(f"UPDATE {archive.STATE_TABLE} SET dirty = 1")
+    data_cache.bump_generation(conn)
+
+
+def clean_phone_numbers(conn):
+    """
+    Strip the '.0' that float-read chunks left on stored phone numbers and
+    merge the doctors that only differed by it. Runs in the caller's transaction.
+    """
+    if not table_columns(conn, star.FACT_TABLE):
+        return
+    star.normalise_facts(conn, CALL_PHONES)
+    star.merge_dimension_duplicates(conn, "dim_doctor", {"doctorPhone": parse_phone})
+    conn.execute(f"UPDATE {archive.STATE_TABLE} SET dirty = 1 WHERE cold = 0")
+    data_cache.bump_generation(conn)
+
+
+def frame_rows(df):
+    """Convert a DataFrame into plain Python tuples that sqlite3 can bind (NaN -> NULL)"""
+    clean = df.astype(object).where(df.notna(), None)
+    return list(clean.itertuples(index=False, name=None))
+
+
+def stage_frame(conn, df):
+    """
+    Append a prepared frame to the temp staging table (created on first use with
+    the live table's column types, so values later compare like for like).
+    Staging only touches the connection's temp database, so it holds no lock on
+    chai.db. Returns the number of rows staged.
+    """
+    if df.empty:
+        return 0
+    columns = list(df.columns)
+    types = calls_column_types(conn)
+    staged = staged_columns(conn)
+    if not staged:
+        defs = ", ".join(column_def(c, types) for c in columns)
+        conn.execute(f"CREATE TEMP TABLE staging_calls ({defs})")
+    else:
+        for col in columns:
+            if col not in staged:
+                conn.execute(f"ALTER TABLE {STAGING_TABLE} ADD COLUMN {column_def(col, types)}")
+    col_list = ", ".join(quote(c) for c in columns)
+    conn.executemany(
+        f"INSERT INTO {STAGING_TABLE} ({col_list}) VALUES ({', '.join(['?'] * len(columns))})",
+        frame_rows(df),
+    )
+    return len(df)
+
+
+def staged_columns(conn):
+    return [row[1] for row in conn.execute("PRAGMA temp.table_info(staging_calls)")]
+
+
+def drop_staging(conn):
+    conn.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+    conn.execute(f"DROP TABLE IF EXISTS {STAGED_FACTS}")
+
+
+def validate_staged(conn):
+    """Raise ValueError if the staged batch is not fit to publish"""
+    columns = staged_columns(conn)
+    missing = [c for c in REQUIRED_COLUMNS if c not in columns]
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(missing)}")
+    bad_dates = conn.execute(f"""
+        SELECT COUNT(*) FROM {STAGING_TABLE}
+        WHERE "Date" IS NULL OR "Date" NOT GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'
+    """).fetchone()[0]
+    if bad_dates:
+        raise ValueError(f"{bad_dates} rows have a missing or malformed Date")
+
+
+def publish_staged(conn):
+    """
+    Upsert the staged batch into call_facts (behind the daily_calls view) keyed
+    on Consultation ID: new rows are inserted, changed rows updated and
+    identical rows skipped. The rollup is recounted for the days that changed
+    and their months are flagged for the Parquet archive. Runs inside the caller's
+    transaction. Returns a dict of inserted/updated/skipped counts.
+    """
+    counts = {"inserted": 0, "updated": 0, "skipped": 0}
+    key = quote(KEY_COLUMN)
+    # Rows without an ID can't be matched on re-import, and a batch may repeat
+    # the same consultation; keep the last copy of each
+    counts["skipped"] = conn.execute(f"""
+        DELETE FROM {STAGING_TABLE}
+        WHERE {key} IS NULL
+           OR rowid NOT IN (SELECT MAX(rowid) FROM {STAGING_TABLE} GROUP BY {key})
+    """).rowcount
+    staged = conn.execute(f"SELECT COUNT(*) FROM {STAGING_TABLE}").fetchone()[0]
+    if not staged:
+        return counts
+
+    columns = staged_columns(conn)
+    ensure_calls_table(conn, columns)
+    # Old months moved out by the retention job come back before they are compared
+    archive.thaw(conn, [row[0] for row in conn.execute(f'SELECT DISTINCT "Date" FROM {STAGING_TABLE}')])
+    # Map dimension columns to their integer keys, then compare and upsert fact to fact
+    star.insert_dimensions(conn, STAGING_TABLE, columns)
+    fact_cols, select = star.fact_select(STAGING_TABLE, columns)
+    conn.execute(f"CREATE TEMP TABLE staging_facts AS {select}")
+    facts = quote(star.FACT_TABLE)
+    col_list = ", ".join(quote(c) for c in fact_cols)
+    others = [c for c in fact_cols if c != KEY_COLUMN]
+
+    changed = " OR ".join(f"d.{quote(c)} IS NOT i.{quote(c)}" for c in others) or "0"
+    counts["inserted"] = conn.execute(f"""
+        SELECT COUNT(*) FROM {STAGED_FACTS} i
+        WHERE NOT EXISTS (SELECT 1 FROM {facts} d WHERE d.{key} = i.{key})
+    """).fetchone()[0]
+    counts["updated"] = conn.execute(f"""
+        SELECT COUNT(*) FROM {STAGED_FACTS} i
+        JOIN {facts} d ON d.{key} = i.{key}
+        WHERE {changed}
+    """).fetchone()[0]
+    counts["skipped"] += staged - counts["inserted"] - counts["updated"]
+
+    if others:
+        updates = ", ".join(f"{quote(c)} = excluded.{quote(c)}" for c in others)
+        differs = " OR ".join(f"{facts}.{quote(c)} IS NOT excluded.{quote(c)}" for c in others)
+        conflict = f"DO UPDATE SET {updates} WHERE {differs}"
+    else:
+        conflict = "DO NOTHING"
+
+    # Days whose rollup counts move: those of new or changed rows, plus the
+    # day a changed row is leaving
+    days = [row[0] for row in conn.execute(f"""
+        SELECT i."Date" FROM {STAGED_FACTS} i
+        LEFT JOIN {facts} d ON d.{key} = i.{key}
+        WHERE d.{key} IS NULL OR {changed}
+        UNION
+        SELECT d."Date" FROM {STAGED_FACTS} i
+        JOIN {facts} d ON d.{key} = i.{key}
+        WHERE {changed}
+    """)]
+
+    # "WHERE true" keeps the upsert clause unambiguous after INSERT ... SELECT
+    conn.execute(f"""
+        INSERT INTO {facts} ({col_list})
+        SELECT {col_list} FROM {STAGED_FACTS} WHERE true
+        ON CONFLICT({key}) {conflict}
+    """)
+    rollup.refresh_days(conn, days)
+    archive.mark_dirty(conn, days)
+    if days:
+        data_cache.bump_generation(conn)  # cached dashboard results are stale from this commit on
+    return counts
+
+
+def publish(conn, before_commit=None):
+    """
+    Validate the staged batch and publish it into daily_calls in one short
+    IMMEDIATE transaction, so readers see either none or all of it.
+    before_commit(conn) can add its own writes (e.g. checkpoints) to the same
+    transaction. The staging table is dropped either way. Returns the counts.
+    """
+    try:
+        if conn.in_transaction:
+            conn.commit()  # staging writes only touched the temp database
+        validate_staged(conn)
+        conn.execute("BEGIN IMMEDIATE")
+        counts = publish_staged(conn)
+        if before_commit:
+            before_commit(conn)
+        conn.commit()
+        return counts
+    except Exception:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    finally:
+        drop_staging(conn)
+
+
+def upsert_frame(conn, df, before_commit=None):
+    """Stage a prepared frame and publish it; returns inserted/updated/skipped counts"""
+    drop_staging(conn)
+    if df.empty:
+        return {"inserted": 0, "updated": 0, "skipped": 0}
+    stage_frame(conn, df)
+    return publish(conn, before_commit)
+
+
+def timed_upsert(df, db_path, batch):
+    conn = connect(db_path)
+    try:
+        started = time.perf_counter()
+        counts = upsert_frame(conn, df)
+        batch.timings["write"] += time.perf_counter() - started
+        return counts
+    finally:
+        conn.close()
+
+
+def upsert_calls(df, db_path=DB_PATH, label="frame"):
+    """Upsert a prepared frame of consultations into daily_calls, recording the batch in the ledger"""
+    with ledger.Batch(label, db_path) as batch:
+        batch.rows = len(df)
+        batch.counts = timed_upsert(df, db_path, batch)
+    return batch.counts
+
+
+class TeeReader:
+    """File-like wrapper that copies everything read from a stream into a sink (e.g. dataset.csv)"""
+
+    def __init__(self, raw, sink=None):
+        self.raw = raw
+        self.sink = sink
+        self.bytes_read = 0
+        self.read_seconds = 0.0  # time spent waiting on the raw stream (i.e. the network)
+
+    def read(self, size=-1):
+        started = time.perf_counter()
+        data = self.raw.read(size)
+        self.read_seconds += time.perf_counter() - started
+        if data:
+            self.bytes_read += len(data)
+            if self.sink is not None:
+                self.sink.write(data)
+        return data
+
+
+def parse_timestamps(series):
+    """"February 10, 2025 10:17 AM" -> "2025-02-10 10:17:00"; unparseable values are kept as is"""
+    parsed = pd.to_datetime(series, format=API_TIMESTAMP_FORMAT, errors='coerce')
+    return parsed.dt.strftime('%Y-%m-%d %H:%M:%S').where(parsed.notna(), series)
+
+
+def parse_age(series):
+    """
+    "20 Y " -> 20.0, "6 M" -> 0.5, "1 Y 6 M" -> 1.5, "10 D" -> 0.03 (years);
+    every value/unit pair is added up and a bare number is taken as years
+    """
+    text = series.astype(str).str.upper().reset_index(drop=True)
+    parts = text.str.extractall(r'(\d+(?:\.\d+)?)\s*([YMWD])?')
+    years = pd.to_numeric(parts[0], errors='coerce') * parts[1].map(AGE_UNITS).fillna(1)
+    total = years.groupby(level=0).sum(min_count=1).reindex(text.index)
+    return pd.Series(total.round(2).to_numpy(), index=series.index)
+
+
+def parse_duration(series):
+    """Free-text call duration -> seconds ("05:30", "1:02:03", "5 min 30 sec", "330")"""
+    text = series.astype(str).str.strip().str.lower()
+    clock = text.str.extract(r'^(?:(\d+):)?(\d+):(\d+)$').apply(pd.to_numeric)
+    from_clock = clock[0].fillna(0) * 3600 + clock[1] * 60 + clock[2]
+    units = text.str.extract(r'(?:(\d+)\s*h\w*)?\s*(?:(\d+)\s*m\w*)?\s*(?:(\d+)\s*s\w*)?').apply(pd.to_numeric)
+    from_units = units[0].fillna(0) * 3600 + units[1].fillna(0) * 60 + units[2].fillna(0)
+    from_units = from_units.where(units.notna().any(axis=1))
+    plain = pd.to_numeric(text, errors='coerce')
+    return from_clock.fillna(from_units).fillna(plain).round().astype('Int64')
+
+
+def parse_flag(series):
+    """yes/no style flags -> 1/0 (anything else -> NULL)"""
+    flags = {"yes": 1, "y": 1, "true": 1, "1": 1, "no": 0, "n": 0, "false": 0, "0": 0}
+    return series.astype(str).str.strip().str.lower().map(flags).astype('Int64')
+
+
+def parse_phone(series):
+    """Phone numbers as text without the '.0' a float column leaves (9492199593.0 -> '9492199593')"""
+    text = series.astype(str).str.strip().str.replace(r'^(\d+)\.0$', r'\1', regex=True)
+    return text.where(series.notna() & (text != ''), None)
+
+
+def normalise_types(df):
+    """Vectorised, one-off parsing of the text columns into the typed daily_calls schema"""
+    for col in CALL_TIMESTAMPS:
+        if col in df.columns:
+            df[col] = parse_timestamps(df[col])
+    if 'PatientAge' in df.columns:
+        df['PatientAge'] = parse_age(df['PatientAge'])
+    if 'Call Duration' in df.columns:
+        df['Call Duration'] = parse_duration(df['Call Duration'])
+    for col in CALL_FLAGS:
+        if col in df.columns:
+            df[col] = parse_flag(df[col])
+    for col in CALL_PHONES:
+        if col in df.columns:
+            df[col] = parse_phone(df[col])
+    return df
+
+
+def detect_date_format(series):
+    """
+    Return the only DATE_FORMATS entry that parses every sampled value, or None
+    if the column is already datetime. Raises ValueError if none or several fit.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return None
+    sample = pd.Series(series.dropna().astype(str).str.strip().unique()[:DATE_SAMPLE])
+    fits = [fmt for fmt in DATE_FORMATS if pd.to_datetime(sample, format=fmt, errors='coerce').notna().all()]
+    if not fits:
+        raise ValueError(f"Unrecognised Date format, e.g. '{sample.iloc[0]}'")
+    if len(fits) > 1:
+        raise ValueError(f"Ambiguous Date format: values like '{sample.iloc[0]}' fit {' and '.join(fits)}; "
+                         "choose the file's date format")
+    return fits[0]
+
+
+def parse_dates(series, date_format=None):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series  # e.g. Excel date cells
+    date_format = date_format or detect_date_format(series)
+    return pd.to_datetime(series.astype(str).str.strip(), format=date_format)
+
+
+def prepare_calls(df, date_format=None):
+    """
+    Shared normalisation for every import path: parse Date once (detecting an
+    unambiguous format unless given), store it as YYYY-MM-DD, derive day/month/year from
+    the same parsed series and type the remaining columns.
+    """
+    parsed = parse_dates(df['Date'], date_format)
+    df['Date'] = parsed.dt.strftime('%Y-%m-%d')
+    df['day'] = parsed.dt.day
+    df['month'] = parsed.dt.month_name()
+    df['year'] = parsed.dt.year
+    return normalise_types(df)
+
+
+def load_calls(conn, source, chunksize=CHUNK_ROWS, on_progress=None, before_commit=None, timings=None,
+               date_format=None):
+    """
+    Stream a call-log CSV (path or file-like) into the staging table chunk by
+    chunk, so memory stays bounded by the chunk size, then validate and publish
+    the whole batch atomically. Dates are read with date_format, or a format
+    detected from the first chunk if none is given. on_progress(rows, elapsed_seconds) is called
+    after each chunk; before_commit(conn, rows) runs inside the publish
+    transaction. Seconds spent reading/parsing and writing are added to
+    timings["parse"] and timings["write"] if given. Returns (rows_read, counts).
+    """
+    timings = timings if timings is not None else {"parse": 0.0, "write": 0.0}
+    rows = 0
+    started = time.perf_counter()
+    drop_staging(conn)
+    try:
+        reader = iter(pd.read_csv(source, chunksize=chunksize, dtype={c: str for c in TEXT_COLUMNS}))
+    except pd.errors.EmptyDataError:
+        reader = iter([])  # no calls in the requested range
+    while True:
+        parse_started = time.perf_counter()
+        chunk = next(reader, None)
+        if chunk is None:
+            timings["parse"] += time.perf_counter() - parse_started
+            break
+        # Detect on the first chunk only so every chunk is read the same way
+        if rows == 0 and date_format is None:
+            date_format = detect_date_format(chunk['Date'])
+        chunk = prepare_calls(chunk, date_format)
+        write_started = time.perf_counter()
+        timings["parse"] += write_started - parse_started
+        stage_frame(conn, chunk)
+        conn.commit()
+        timings["write"] += time.perf_counter() - write_started
+        rows += len(chunk)
+        if on_progress:
+            on_progress(rows, time.perf_counter() - started)
+
+    write_started = time.perf_counter()
+    if rows == 0:
+        counts = {"inserted": 0, "updated": 0, "skipped": 0}
+        if before_commit:
+            before_commit(conn, rows)
+            conn.commit()
+    else:
+        hook = (lambda c: before_commit(c, rows)) if before_commit else None
+        counts = publish(conn, hook)
+    timings["write"] += time.perf_counter() - write_started
+    return rows, counts
+
+
+def source_size(source, batch):
+    """Fill in the batch's byte count (and network time, for TeeReader streams) from a load source"""
+    if isinstance(source, TeeReader):
+        batch.bytes = source.bytes_read
+        # Network waits happened inside the CSV reader; move them out of "parse"
+        batch.timings["download"] += source.read_seconds
+        batch.timings["parse"] = max(0.0, batch.timings["parse"] - source.read_seconds)
+    elif isinstance(source, (str, os.PathLike)):
+        batch.bytes = os.path.getsize(source)
+    elif hasattr(source, "tell"):
+        batch.bytes = source.tell()
+
+
+def stream_calls(source, db_path=DB_PATH, chunksize=CHUNK_ROWS, on_progress=None, label="csv", date_format=None):
+    """Stream a call-log CSV into daily_calls through the staging table, recording the batch in the ledger"""
+    conn = connect(db_path)
+    try:
+        with ledger.Batch(label, db_path) as batch:
+            batch.rows, batch.counts = load_calls(conn, source, chunksize, on_progress, timings=batch.timings,
+                                                  date_format=date_format)
+            source_size(source, batch)
+        return batch.rows, batch.counts
+    finally:
+        conn.close()
+
+
+def infer_type(values):
+    """Pick INTEGER, REAL or TEXT for a column from a sample of its (string) values"""
+    kind = "INTEGER"
+    for v in values:
+        if v == "":
+            continue
+        if len(v) > 1 and v[0] == "0" and v[1] != ".":
+            return "TEXT"  # leading zeros (codes, phone numbers) must survive
+        try:
+            int(v)
+            continue
+        except ValueError:
+            pass
+        try:
+            float(v)
+            kind = "REAL"
+        except ValueError:
+            return "TEXT"
+    return kind
+
+
+def convert(value, kind):
+    if value == "":
+        return None
+    try:
+        if kind == "INTEGER":
+            return int(value)
+        if kind == "REAL":
+            return float(value)
+    except ValueError:
+        pass  # the sample missed a text value; keep it as is
+    return value
+
+
+def table_name_for(filename):
+    return os.path.splitext(os.path.basename(filename))[0]
+
+
+def bulk_load_csv(buffer, table, db_path=DB_PATH, batch_size=BATCH_ROWS, on_progress=None):
+    """
+    Stream a CSV buffer (e.g. a Streamlit UploadedFile) into table using large
+    executemany batches inside one transaction. Column types are inferred from
+    the first SAMPLE_ROWS rows. Returns a dict with rows, seconds and rows_per_sec.
+    """
+    with ledger.Batch(f"bulk:{table}", db_path) as batch:
+        try:
+            result = _bulk_load(buffer, table, db_path, batch_size, on_progress, "utf-8-sig")
+        except UnicodeDecodeError:
+            # Files saved from Excel on Windows are often cp1252 rather than UTF-8
+            buffer.seek(0)
+            result = _bulk_load(buffer, table, db_path, batch_size, on_progress, "cp1252")
+        batch.rows = batch.counts["inserted"] = result["rows"]
+        batch.bytes = getattr(buffer, "size", None) or buffer.tell()
+        batch.timings["write"] = result["seconds"]
+    return result
+
+
+def _bulk_load(buffer, table, db_path, batch_size, on_progress, encoding):
+    started = time.perf_counter()
+    text = io.TextIOWrapper(buffer, encoding=encoding, newline="")
+    reader = csv.reader(text)
+    headers = next(reader)
+    width = len(headers)
+
+    sample = list(itertools.islice(reader, SAMPLE_ROWS))
+    kinds = [infer_type([row[i] for row in sample if i < len(row)]) for i in range(width)]
+
+    def prepared(rows):
+        for row in rows:
+            row = (row + [""] * width)[:width]
+            yield tuple(convert(v, k) for v, k in zip(row, kinds))
+
+    col_defs = ", ".join(f"{quote(h)} {k}" for h, k in zip(headers, kinds))
+    col_list = ", ".join(quote(h) for h in headers)
+    insert = f"INSERT INTO {quote(table)} ({col_list}) VALUES ({', '.join(['?'] * width)})"
+
+    rows = 0
+    # A private connection: LOAD_PRAGMAS must not leak into pooled ones
+    conn = sqlite3.connect(db_path)
+    try:
+        for pragma in LOAD_PRAGMAS:
+            conn.execute(pragma)
+        conn.execute("BEGIN")
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {quote(table)} ({col_defs})")
+        source = prepared(itertools.chain(sample, reader))
+        while True:
+            batch = list(itertools.islice(source, batch_size))
+            if not batch:
+                break
+            conn.executemany(insert, batch)
+            rows += len(batch)
+            if on_progress:
+                on_progress(rows, time.perf_counter() - started)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        text.detach()  # leave the caller's buffer open
+        conn.close()
+
+    seconds = time.perf_counter() - started
+    return {"rows": rows, "seconds": seconds, "rows_per_sec": rows / seconds if seconds else 0}
+
+
+def import_file(buffer, filename, db_path=DB_PATH, on_progress=None, date_format=None):
+    """
+    Import an uploaded call-log CSV or Excel file through the shared pipeline;
+    returns (rows, counts). date_format is the layout of its Date column (see
+    DATE_FORMATS); without it the layout must be unambiguous.
+    """
+    label = f"upload:{filename}"
+    if filename.endswith(".xlsx"):
+        with ledger.Batch(label, db_path) as batch:
+            started = time.perf_counter()
+            df = prepare_calls(pd.read_excel(buffer, dtype={c: str for c in TEXT_COLUMNS}), date_format)
+            batch.timings["parse"] = time.perf_counter() - started
+            batch.rows, batch.bytes = len(df), getattr(buffer, "size", None) or buffer.tell()
+            batch.counts = timed_upsert(df, db_path, batch)
+        return batch.rows, batch.counts
+    return stream_calls(buffer, db_path, on_progress=on_progress, label=label, date_format=date_format)
@@ -0,0 +1,115 @@
+import sqlite3
+import db
+import time
+from datetime import datetime
+import pandas as pd
+
+LEDGER_TABLE = "ingest_batches"
+STAGES = ["download", "parse", "write"]
+
+
+def create_ledger_table(conn):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {LEDGER_TABLE} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            source TEXT,
+            started_at TEXT,
+            finished_at TEXT,
+            status TEXT,
+            bytes INTEGER,
+            rows INTEGER,
+            inserted INTEGER,
+            updated INTEGER,
+            skipped INTEGER,
+            download_s REAL,
+            parse_s REAL,
+            write_s REAL,
+            total_s REAL,
+            error TEXT
+        )
+    """)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{LEDGER_TABLE}_started ON {LEDGER_TABLE} (started_at)")
+
+
+class Batch:
+    """
+    One ingestion run. Callers fill in bytes/rows/counts and add seconds to
+    timings["download"|"parse"|"write"]; on exit the run is written to
+    ingest_batches, including the error if the block raised.
+    """
+
+    def __init__(self, source, db_path="chai.db"):
+        self.source = source
+        self.db_path = db_path
+        self.timings = {stage: 0.0 for stage in STAGES}
+        self.bytes = 0
+        self.rows = 0
+        self.counts = {}
+
+    def __enter__(self):
+        self.started_at = datetime.now()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # A download may have finished before the batch was opened (backfill workers)
+        total = max(time.perf_counter() - self._started, sum(self.timings.values()))
+        try:
+            record(self, total, "error" if exc else "ok", str(exc) if exc else None)
+        except sqlite3.Error as e:
+            print(f"Error writing ingest ledger: {e}")
+        return False  # never swallow the ingestion error
+
+
+def record(batch, total, status, error):
+    conn = db.get_connection(batch.db_path)
+    try:
+        create_ledger_table(conn)
+        conn.execute(
+            f"""INSERT INTO {LEDGER_TABLE} (source, started_at, finished_at, status, bytes, rows,
+                    inserted, updated, skipped, download_s, parse_s, write_s, total_s, error)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (batch.source, batch.started_at.isoformat(timespec="seconds"),
+             datetime.now().isoformat(timespec="seconds"), status, batch.bytes, batch.rows,
+             batch.counts.get("inserted", 0), batch.counts.get("updated", 0), batch.counts.get("skipped", 0),
+             batch.timings["download"], batch.timings["parse"], batch.timings["write"], total, error),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def recent_batches(limit=100, db_path="chai.db"):
+    conn = db.get_connection(db_path)
+    try:
+        create_ledger_table(conn)
+        return pd.read_sql_query(
+            f"SELECT * FROM {LEDGER_TABLE} ORDER BY id DESC LIMIT ?", conn, params=(limit,))
+    finally:
+        conn.close()
+
+
+def daily_throughput(days=30, db_path="chai.db"):
+    """Rows, bytes and time spent per stage for each day, plus rows/sec"""
+    conn = db.get_connection(db_path)
+    try:
+        create_ledger_table(conn)
+        df = pd.read_sql_query(f"""
+            SELECT substr(started_at, 1, 10) AS day,
+                   COUNT(*) AS batches,
+                   SUM(status = 'error') AS errors,
+                   SUM(rows) AS rows,
+                   SUM(bytes) AS bytes,
+                   SUM(download_s) AS download_s,
+                   SUM(parse_s) AS parse_s,
+                   SUM(write_s) AS write_s,
+                   SUM(total_s) AS total_s
+            FROM {LEDGER_TABLE}
+            WHERE started_at >= date('now', ?)
+            GROUP BY day
+            ORDER BY day
+        """, conn, params=(f"-{days} days",))
+    finally:
+        conn.close()
+    df["rows_per_sec"] = (df["rows"] / df["total_s"]).where(df["total_s"] > 0, 0).round(1)
+    return df
@@ -1,7 +1,6 @@
 import pandas as pd
-import sqlite3
+import db
 import os
-import csv
 import webbrowser
 from datetime import datetime, date, timedelta
 import streamlit as st
@@ -15,6 +14,17 @@ import Sql_manage as sqm
 import reminder as rem
 import rpodash as rp
 import dbcommand as dc
+import ingest
+import backfill as bf
+import poller
+import ledger
+import migrations
+import rollup
+import archive
+import maintenance
+import region_cache
+import data_cache
+import charts
 
 
 # st.set_page_config(
@@ -49,7 +59,7 @@ def login():
                 st.rerun()  # Use experimental_rerun to refresh the app
             
             else:
-                conn = sqlite3.connect("chai.db")
+                conn = db.get_connection()
                 cursor = conn.cursor()
                 cursor.execute('SELECT * FROM users WHERE email=? AND password=?', (username, password))
                 data = cursor.fetchone()
@@ -70,13 +80,28 @@ def login():
                 
                 conn.close()
 
+@data_cache.cached
+def tracking_summary(day):
+    """Aggregates shown on the Daily Tracking page for one day, read from the rollup table."""
+    df = rollup.load_rollup(day, day)
+    status_count = rollup.call_pivot(df, "doctorName", "Status_Final")
+    df = df.rename(columns={"Nurse Name": "NurseName"})
+    return {
+        "n": int(df["calls"].sum()),
+        "sn": df["NurseName"].nunique(),
+        "status": df.groupby("Status_Final")["calls"].sum(),
+        "doctor_status": status_count.reset_index().rename_axis(None, axis=1),
+        "regions": df.groupby("RegionalUnit")["calls"].sum(),
+        "sisters": df.groupby("NurseName")["calls"].sum(),
+    }
+
 def admin_page():
     if st.sidebar.button("Logout"):
         st.session_state.user = None  # Clear user session  
         st.success("You have been logged out successfully!")
         st.rerun()
     st.title("CHAI TELE MEDICINE DASHBOARD")
-    conn = sqlite3.connect("chai.db")
+    conn = db.get_connection()
     csv_file = "dataset.csv"
     def downlaod_prescription():
         st.header("Patient Prescriptions")  
@@ -84,19 +109,10 @@ def admin_page():
         start_date = st.date_input("Start Date")
         end_date = st.date_input("End Date")
 
-        # Function to get consultation data
+        # Function to get consultation data (Parquet archive for settled months, SQLite for the rest;
+        # cached across reruns until ingestion brings new data)
         def get_consultation_data(start_date, end_date):
-            conn = sqlite3.connect("chai.db")
-            try:
-                query = f"""
-                SELECT *
-                FROM daily_calls
-                WHERE date BETWEEN '{start_date}' AND '{end_date}'
-                """
-                df = pd.read_sql_query(query, conn)
-                return df
-            finally:
-                conn.close()
+            return archive.read_calls(start_date, end_date)
 
         # Get data based on date range
         if start_date and end_date:
@@ -174,35 +190,20 @@ def admin_page():
             except Exception as e:
                 st.error(f"Error retrieving data: {str(e)}")
 
-    def export_to_sql(csv_file):
-        # Read the CSV file
-        df = pd.read_csv(csv_file)
-        n = len(df)  # This is where n is calculated
-
-        # Convert the 'Date' column to the correct format
-        df['Date'] = pd.to_datetime(df['Date'], format='%d-%m-%Y').dt.strftime('%Y-%m-%d')
-
-        # Add new columns for day, month, and year
-        df['day'] = pd.to_datetime(df['Date']).dt.day
-        df['month'] = pd.to_datetime(df['Date']).dt.strftime('%B')  # Month name
-        df['year'] = pd.to_datetime(df['Date']).dt.year
-
-        # Write the DataFrame to the SQLite database
-        conn = sqlite3.connect('chai.db')  # Ensure connection is created in the current thread
+    def export_to_sql(csv_file, on_progress=None):
+        # Stream the CSV into the database chunk by chunk; dates are parsed once per chunk
+        # and rows are upserted so re-downloading a range doesn't duplicate them
+        n, counts = 0, {"inserted": 0, "updated": 0, "skipped": 0}
         try:
-            df.to_sql("daily_calls", conn, if_exists='append', index=False)
-            conn.commit()
+            n, counts = ingest.stream_calls(csv_file, on_progress=on_progress, label="date_wise",
+                                             date_format=ingest.API_DATE_FORMAT)
         except Exception as e:
             print(f"Error: {e}")
-        finally:
-            conn.close()
         
-        return n  # Return n to be used later
+        return n, counts  # Return n and the upsert counts to be used later
 
     def csv_to_sqlite():
         st.header("Uploading Csv to Db")
-        conn = sqlite3.connect('chai.db')  # Get connection in the current thread
-        cursor = conn.cursor()
         uploaded_file = st.file_uploader("Choose a file", type=["csv", "xlsx"])
 
         if uploaded_file is not None:
@@ -211,29 +212,22 @@ def admin_page():
 
             # Process CSV or Excel file
             if uploaded_file.name.endswith(".csv"):
-
-                with open(uploaded_file.name, 'r') as file:
-                    tname=uploaded_file.name.split(".")
-
-                    csv_reader = csv.reader(file)
-                    headers = next(csv_reader)
-                    
-                    # Create the table if it doesn't exist
-                    create_table_query = f"CREATE TABLE IF NOT EXISTS {tname[0]} ({', '.join(headers)});"
-                    cursor.execute(create_table_query)
-                    
-                    # Insert data
-                    insert_data_query = f"INSERT INTO {tname[0]} VALUES ({', '.join(['?'] * len(headers))});"
-                    for row in csv_reader:
-                        cursor.execute(insert_data_query, row)
-                
-                conn.commit()
-                st.success("CSV data inserted into SQLite successfully!")
-                conn.close()
+                # Stream the uploaded buffer straight into the table in large batches
+                tname = ingest.table_name_for(uploaded_file.name)
+                status = st.empty()
+                try:
+                    result = ingest.bulk_load_csv(
+                        uploaded_file, tname,
+                        on_progress=lambda rows, elapsed: status.write(f"{rows} rows loaded..."))
+                    st.success("CSV data inserted into SQLite successfully!")
+                    st.write(f"{result['rows']} rows in {result['seconds']:.2f}s "
+                             f"({result['rows_per_sec']:.0f} rows/sec)")
+                except Exception as e:
+                    st.error(f"Error loading CSV: {e}")
     def sqlite_to_excel():
         try:
             # Create a new connection in the current thread
-            conn = sqlite3.connect('chai.db')
+            conn = db.get_connection()
             
             # Execute the query
             query = "SELECT * FROM daily_calls;"
@@ -259,69 +253,225 @@ def admin_page():
             return
         
         url = f"https://champs.billionlives.in:8000/consultation_api/getCallLogsCSV?startdate={start_date}&enddate={end_date}"
-        response = requests.get(url)
+        # Same retrying session and timeouts as the backfill, so a stalled API can't hang the page
+        try:
+            response = bf.make_session().get(url, stream=True, timeout=bf.TIMEOUT)
+        except requests.RequestException as e:
+            st.error(f"Failed to download file: {e}")
+            return
 
         if response.status_code == 200:
             csv_file_path = "dataset.csv"
+            status = st.empty()
+
+            def show_progress(rows, elapsed):
+                rate = rows / elapsed if elapsed else 0
+                status.write(f"{rows} rows processed ({rate:.0f} rows/sec)")
+
+            # Read the response in chunks, saving it to dataset.csv while it is parsed
+            response.raw.decode_content = True
             with open(csv_file_path, "wb") as file:
-                file.write(response.content)
-            
-            # Now pass csv_file_path to export_to_sql and get n
-            n = export_to_sql(csv_file_path)
+                source = ingest.TeeReader(response.raw, file)
+                n, counts = export_to_sql(source, on_progress=show_progress)
             
             # Now run sqlite_to_excel
             #sqlite_to_excel()
             
             st.success("File downloaded and exported to Database successfully!")
             st.write(f"{n} Datas exported successfully!")
+            st.write(f"Inserted: {counts['inserted']}, Updated: {counts['updated']}, Skipped: {counts['skipped']}")
         else:
             st.error(f"Failed to download file. Status code: {response.status_code}")
 
-    #Download csv and displaying total counts each time
-    def download_file():
-        url = "https://champs.billionlives.in:8000/consultation_api/getTodayCallLogsCSV"
-        response = requests.get(url)
+    def upload_files():
+        """Import a call-log CSV/Excel export through the shared ingestion pipeline."""
+        st.header("Upload Files")
+        uploaded_file = st.file_uploader("Choose a call log file", type=["csv", "xlsx"], key="calls_upload")
 
-        if response.status_code == 200:
-            with open("dataset.csv", "wb") as file:
-                file.write(response.content)
-            
+        # Detection refuses dates that fit several layouts (e.g. 02-05-2025)
+        date_format = st.selectbox("Date format", ["Detect"] + ingest.DATE_FORMATS, key="calls_upload_date_format")
+
+        if uploaded_file is not None:
+            st.success(f"Uploaded file: {uploaded_file.name}")
+            try:
+                n, counts = ingest.import_file(uploaded_file, uploaded_file.name,
+                                               date_format=None if date_format == "Detect" else date_format)
+                st.success(f"{n} Datas exported successfully!")
+                st.write(f"Inserted: {counts['inserted']}, Updated: {counts['updated']}, Skipped: {counts['skipped']}")
+            except Exception as e:
+                st.error(f"Error importing file: {e}")
+
+    def backfill_by_date():
+        """Fetch a long date range in parallel per-day windows, resuming from checkpoints."""
+        st.header("Backfill Date Range")
+        yesterday = (datetime.now() - timedelta(days=1)).strftime("%d-%m-%Y")
+        start_date = st.text_input("Enter Start Date (DD-MM-YYYY)", value=yesterday, key="backfill_start_date")
+        end_date = st.text_input("Enter End Date (DD-MM-YYYY)", value=yesterday, key="backfill_end_date")
+        col1, col2 = st.columns(2)
+        with col1:
+            window_days = st.number_input("Days per request", min_value=1, max_value=31, value=1)
+        with col2:
+            workers = st.number_input("Parallel downloads", min_value=1, max_value=8, value=4)
+
+        if st.button("Start Backfill"):
+            try:
+                datetime.strptime(start_date, "%d-%m-%Y")
+                datetime.strptime(end_date, "%d-%m-%Y")
+            except ValueError:
+                st.error("Invalid date format. Please enter dates in DD-MM-YYYY format.")
+                return
+
+            bar = st.progress(0.0)
+            status = st.empty()
+
+            def show_window(done, total, days, rows, error):
+                bar.progress(done / total)
+                label = f"{days[0]:%d-%m-%Y} to {days[-1]:%d-%m-%Y}"
+                if error:
+                    status.write(f"{label}: failed ({error})")
+                else:
+                    status.write(f"{label}: {rows} rows ({done}/{total} windows)")
+
+            summary = bf.backfill(start_date, end_date, window_days=int(window_days),
+                                  workers=int(workers), on_window=show_window)
+            bar.progress(1.0)
+            st.success(f"Backfill finished: {summary['rows']} rows from {summary['windows']} windows "
+                       f"({summary['resumed_days']} days already done)")
+            st.write(f"Inserted: {summary['inserted']}, Updated: {summary['updated']}, Skipped: {summary['skipped']}")
+            if summary["failed"]:
+                st.warning(f"{len(summary['failed'])} windows failed; run the backfill again to retry them.")
+                st.write(summary["failed"])
+
+    #Today's call log is polled in the background and read back from daily_calls
+    def ingestion_ledger():
+        """Recent ingestion batches with per-stage timings and throughput trends."""
+        st.header("Ingestion Ledger")
+        days = st.slider("Days to show", min_value=7, max_value=180, value=30)
+        trend = ledger.daily_throughput(days)
+        batches = ledger.recent_batches(200)
+
+        if batches.empty:
+            st.info("No ingestion batches recorded yet.")
+            return
+
+        col1, col2, col3 = st.columns(3)
+        last = batches.iloc[0]
+        with col1:
+            st.metric(label="Last batch", value=f"{last['rows']} rows", delta=last["status"], delta_color="off")
+        with col2:
+            st.metric(label="Last batch time", value=f"{last['total_s']:.1f}s")
+        with col3:
+            st.metric(label="Errors (shown batches)", value=int((batches["status"] == "error").sum()))
+
+        if not trend.empty:
+            st.subheader("Throughput (rows/sec)")
+            st.line_chart(trend.set_index("day")["rows_per_sec"])
+            st.subheader("Time per stage (seconds)")
+            st.bar_chart(trend.set_index("day")[["download_s", "parse_s", "write_s"]])
+
+        st.subheader("Recent batches")
+        st.dataframe(batches)
+        failed = batches[batches["status"] == "error"]
+        if not failed.empty:
+            with st.expander(f"Failed batches ({len(failed)})"):
+                st.dataframe(failed[["started_at", "source", "error"]])
+
+        # Edits made outside the ingestion pipeline (SQL Manager, SQL Command) bypass the rollup
+        if st.button("Rebuild dashboard rollups"):
+            conn = ingest.connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                days = rollup.rebuild(conn)
+                conn.commit()
+            finally:
+                conn.close()
+            st.success(f"Recounted {days} days from daily_calls")
+
+        # Parquet mirror of daily_calls used for large date ranges; `python archive.py` does the same
+        if st.button("Sync Parquet archive"):
+            status = st.empty()
+            months = archive.sync(on_month=lambda month, rows: status.write(f"{month}: {rows} rows"))
+            st.success(f"Exported {len(months)} changed months to {archive.ARCHIVE_DIR}")
+
+        # Checkpoint, optimize, vacuum and retention run in the background; `python maintenance.py` does the same
+        with st.expander("Database maintenance"):
+            runs = maintenance.last_runs()
+            if runs:
+                st.dataframe(pd.DataFrame(
+                    [(task, *run) for task, run in runs.items()],
+                    columns=["task", "last_run", "seconds", "result", "error"],
+                ))
+            if maintenance.RETENTION_MONTHS:
+                st.caption(f"Consultations older than {maintenance.RETENTION_MONTHS} months are kept only in the Parquet archive.")
+            else:
+                st.caption("Retention is off: every consultation stays in SQLite.")
+            if st.button("Run maintenance now"):
+                with st.spinner("Running maintenance..."):
+                    done = maintenance.run_due(force=True)
+                for task, outcome in done.items():
+                    st.write(f"{task}: {outcome}")
+
+        # Query results shared by all dashboard sessions until the next load changes the data
+        with st.expander("Dashboard cache"):
+            stats = data_cache.stats()
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("Hit rate", f"{stats['hit_rate']:.0%}")
+            col2.metric("Hits / misses", f"{stats['hits']} / {stats['misses']}")
+            col3.metric("Entries", stats["entries"])
+            col4.metric("Memory", f"{stats['bytes'] / 1e6:.1f} MB")
+            st.caption(f"{stats['evictions']} results evicted; data generation {data_cache.generation()}")
+            chart_stats = charts.stats()
+            st.caption(f"Charts: {chart_stats['entries']} cached PNGs, {chart_stats['hit_rate']:.0%} reused")
+            # Edits made by hand (SQL Manager, SQL Command) don't bump the generation
+            if st.button("Clear cache"):
+                data_cache.clear()
+                st.rerun()
+
+    def sync_status():
+        poller.start_background()
+        status = poller.get_status()
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            if status is None:
+                st.caption("Waiting for the first download of today's call log...")
+            elif status["error"]:
+                st.caption(f"Last sync {status['last_run']} failed: {status['error']}")
+            else:
+                st.caption(f"Last synced {status['last_run']} ({status['rows']} rows, {status['inserted']} new)")
+        with col2:
+            if st.button("Refresh now"):
+                poller.poll_once()
+                st.rerun()
+        return status
 
     def tracking():
-            """Tracking details from the dataset."""
+            """Tracking details from today's rows in daily_calls."""
             try:    
-                df = pd.read_csv("dataset.csv")
-                n = len(df) - 1
-                no_of_sister = df["Nurse Name"].unique()
-                sn = len(no_of_sister)
+                today = date.today().strftime('%Y-%m-%d')
+                # Cached until a load, edit or poll changes the data generation
+                summary = tracking_summary(today)
                 
                 col1, col2 = st.columns(2)
                 
                 with col1:
                     st.header("Total Consultation")
-                    st.metric(label="Consultations", value=n)
+                    st.metric(label="Consultations", value=summary["n"])
                 
                 with col2:
                     st.header("Total No. of Sisters")
-                    st.metric(label="Nurses", value=sn)
+                    st.metric(label="Nurses", value=summary["sn"])
                 
                 with st.expander("Consultation Status"):
-                    df2 = df["Status_Final"].groupby(df["Status_Final"]).count()
-                    st.write(df2)
+                    st.write(summary["status"])
                 
                 with st.expander("Doctors Consultation Status"):
-                    status_count = df.groupby([df["doctorName"], df["Status_Final"]]).size().unstack(fill_value=0)
-                    status_count = status_count.reset_index().rename_axis(None, axis=1)
-                    st.write(status_count)
+                    st.write(summary["doctor_status"])
                 
                 with st.expander("Regional Wise Status"):
-                    reg_count = df["RegionalUnit"].groupby(df["RegionalUnit"]).count()
-                    st.write(reg_count)
+                    st.write(summary["regions"])
                 
                 with st.expander("Sister Nurse Status"):
-                    df = df.rename(columns={"Nurse Name": "NurseName"})
-                    sister_count = df["NurseName"].groupby(df["NurseName"]).count()
-                    st.write(sister_count)
+                    st.write(summary["sisters"])
             except Exception as e:
         
                 st.error(f"Error: {e}")
@@ -354,7 +504,7 @@ def admin_page():
         dash.dashboard()
 
     elif main_option=="Daily Tracking":
-        download_file()
+        sync_status()
         tracking()
 
     elif main_option=="Doctor Live":
@@ -366,7 +516,7 @@ def admin_page():
     elif main_option=="Import/Export":
         import_option = st.sidebar.selectbox(
             "Import/Export Menu:",
-            ["Date Wise Download","Upload Files","Download Prescription","Upload Csv to Db"])
+            ["Date Wise Download","Backfill Date Range","Upload Files","Download Prescription","Upload Csv to Db","Ingestion Ledger"])
         if import_option == "Date Wise Download":
             st.header("Download Data Date Wise")
             yesterday = (datetime.now() - timedelta(days=1)).strftime("%d-%m-%Y")
@@ -385,12 +535,16 @@ def admin_page():
                         st.error("Invalid date format. Please enter dates in DD-MM-YYYY format.")
                 else:
                     st.error("Please enter both start and end dates.")
+        elif import_option == "Backfill Date Range":
+            backfill_by_date()
         elif import_option == "Upload Files":
-            st.write("Upload Files")
+            upload_files()
         elif import_option == "Download Prescription":
             downlaod_prescription()
         elif import_option == "Upload Csv to Db":
             csv_to_sqlite()
+        elif import_option == "Ingestion Ledger":
+            ingestion_ledger()
     elif main_option=="Admin":
         st.write("Welcome to Admin")
         admin_option = st.sidebar.selectbox(
@@ -407,7 +561,7 @@ def admin_page():
             
             def list_users():
                 st.subheader("List of Users")
-                conn = sqlite3.connect('chai.db')
+                conn = db.get_connection()
                 cursor = conn.cursor()
                 cursor.execute('SELECT * FROM users')
                 users = cursor.fetchall()
@@ -421,7 +575,7 @@ def admin_page():
             # Function to edit user
             def edit_user():
                 st.subheader("Edit User")
-                conn = sqlite3.connect('chai.db')
+                conn = db.get_connection()
                 cursor = conn.cursor()
                 cursor.execute('SELECT userid, name FROM users')
                 users = cursor.fetchall()
@@ -432,7 +586,7 @@ def admin_page():
 
                 if selected_user:
                     user_id = user_options[selected_user]
-                    conn = sqlite3.connect('chai.db')
+                    conn = db.get_connection()
                     cursor = conn.cursor()
                     cursor.execute('SELECT * FROM users WHERE userid = ?', (user_id,))
                     user_details = cursor.fetchone()
@@ -447,7 +601,7 @@ def admin_page():
                         password = st.text_input('Password', user_details[6], type='password')
 
                         if st.button('Update User'):
-                            conn = sqlite3.connect('chai.db')
+                            conn = db.get_connection()
                             cursor = conn.cursor()
                             cursor.execute('''
                                 UPDATE users 
@@ -461,7 +615,7 @@ def admin_page():
             # Function to delete user
             def delete_user():
                 st.subheader("Delete User")
-                conn = sqlite3.connect('chai.db')
+                conn = db.get_connection()
                 cursor = conn.cursor()
                 cursor.execute('SELECT userid, name FROM users')
                 users = cursor.fetchall()
@@ -473,7 +627,7 @@ def admin_page():
                 if selected_user:
                     user_id = user_options[selected_user]
                     if st.button('Delete User'):
-                        conn = sqlite3.connect('chai.db')
+                        conn = db.get_connection()
                         cursor = conn.cursor()
                         cursor.execute('DELETE FROM users WHERE userid = ?', (user_id,))
                         conn.commit()
@@ -503,7 +657,7 @@ def admin_page():
                 regional_unit = st.selectbox('Regional Unit', ["All", "CHAAP", "CHABIJAN", "CHAKA", "CHAKE", "CHAMP", "CHAT", "CHAW", "NECHA", "OCHA", "RUPCHA", "WEBCHA" ])
                 password = st.text_input('Password', type='password')
                 if st.button('Add User'):
-                    conn = sqlite3.connect('chai.db')   
+                    conn = db.get_connection()   
                     cursor = conn.cursor()
                     cursor.execute('''INSERT INTO users (name, mobile, email, post, RegionalUnit, password) VALUES (?, ?, ?, ?, ?, ?)''', (name, mobile, email, post, regional_unit, password))
                     conn.commit()
@@ -531,7 +685,7 @@ def user_page():
     email = st.session_state.user.get("email")
 
     def change_password(email):
-        con = sqlite3.connect("chai.db")
+        con = db.get_connection()
         cursor = con.cursor()
 
         # Fetch the current password for the user
@@ -576,7 +730,7 @@ def user_page():
         # Retrieve user details from the database
         email = st.session_state.user.get("email")
          # Assuming the email is stored in the session state
-        conn = sqlite3.connect("chai.db")
+        conn = db.get_connection()
         cursor = conn.cursor()
         cursor.execute('SELECT name, mobile, email, post, RegionalUnit FROM users WHERE email=?', (email,))
         user_data = cursor.fetchone()
@@ -608,7 +762,7 @@ def user_page():
             change_password(email)
 def display_sister(reg):
     
-    con = sqlite3.connect("chai.db")
+    con = db.get_connection()
     
     if reg!="All":
     # Correcting the query formatting
@@ -668,4 +822,7 @@ def display_sister(reg):
     con.close()
 
 
+migrations.migrate_once()
+maintenance.start_background()
+region_cache.start_background()
 login()
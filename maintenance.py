@@ -0,0 +1,245 @@
+import argparse
+import threading
+import time
+from datetime import date, datetime
+import archive
+import ingest
+import sister_search
+import snapshot
+import star
+
+RUNS_TABLE = "maintenance_runs"
+CHECK_SECONDS = 600  # how often the background thread looks for due tasks
+# Months of consultations kept in SQLite; older ones live only in the Parquet archive. Off (0) by
+# default: the dashboards, exports and SQL tools read SQLite, so only opt in (e.g. with
+# `python maintenance.py --retention-months 24`) where older months are read from the archive.
+RETENTION_MONTHS = 0
+VACUUM_FREE_RATIO = 0.2  # one full VACUUM (switching on incremental auto_vacuum) once this much of the file is free
+ANALYSIS_LIMIT = 1000  # rows sampled per index by PRAGMA optimize, so it stays quick on big tables
+
+# Seconds between runs of each task
+CHECKPOINT_SECONDS = 3600
+OPTIMIZE_SECONDS = 24 * 3600
+ANALYZE_SECONDS = 7 * 24 * 3600
+RETENTION_SECONDS = 24 * 3600
+VACUUM_SECONDS = 24 * 3600
+SNAPSHOT_SECONDS = snapshot.MAX_AGE_SECONDS
+
+_thread = None
+_lock = threading.Lock()
+
+
+def create_runs_table(conn):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {RUNS_TABLE} (
+            task TEXT PRIMARY KEY,
+            last_run TEXT,
+            seconds REAL,
+            result TEXT,
+            error TEXT
+        )
+    """)
+
+
+def checkpoint(db_path=ingest.DB_PATH):
+    """Copy the WAL back into chai.db and truncate it, so the -wal file stops growing"""
+    conn = ingest.connect(db_path)
+    try:
+        busy, frames, copied = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+    finally:
+        conn.close()
+    return f"{copied} of {frames} frames copied" + (" (readers busy)" if busy else "")
+
+
+def optimize(db_path=ingest.DB_PATH):
+    """Refresh planner statistics that SQLite thinks are stale"""
+    conn = ingest.connect(db_path)
+    try:
+        conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+        conn.execute("PRAGMA optimize")
+        conn.execute("PRAGMA analysis_limit = 0")
+    finally:
+        conn.close()
+    return "ok"
+
+
+def analyze(db_path=ingest.DB_PATH):
+    """Full ANALYZE of every table and index"""
+    conn = ingest.connect(db_path)
+    try:
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+    return "ok"
+
+
+def cutoff_month(months, today=None):
+    """YYYY-MM of the oldest month kept in SQLite when keeping `months` months"""
+    today = today or date.today()
+    index = today.year * 12 + today.month - 1 - months
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def apply_retention(db_path=ingest.DB_PATH, months=RETENTION_MONTHS, root=archive.ARCHIVE_DIR):
+    """
+    Move consultations older than `months` months out of SQLite: each month is
+    exported to the Parquet archive first and only deleted once its partition
+    holds every row. read_calls and the rollup keep serving them; a later load
+    into such a month brings it back. months=0 turns retention off.
+    """
+    if not months:
+        return "off"
+    archive.sync(db_path, root)
+    cutoff = cutoff_month(months)
+    conn = ingest.connect(db_path)
+    moved, rows = 0, 0
+    try:
+        archive.create_state_table(conn)
+        candidates = [row[0] for row in conn.execute(
+            f"SELECT month FROM {archive.STATE_TABLE} WHERE month < ? AND dirty = 0 AND cold = 0 ORDER BY month",
+            (cutoff,))]
+        for month in candidates:
+            # One month per transaction, so loads are never held up for long
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                count = archive.freeze(conn, month, root)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            if count:
+                moved += 1
+                rows += count
+    finally:
+        conn.close()
+    return f"{rows} rows in {moved} months before {cutoff} moved to the archive"
+
+
+def full_vacuum(conn):
+    """VACUUM, then rebuild what points at rowids it may have renumbered"""
+    conn.execute("VACUUM")
+    if star.object_type(conn, sister_search.FTS_TABLE):
+        conn.execute("BEGIN IMMEDIATE")
+        sister_search.rebuild(conn)
+        conn.commit()
+
+
+def vacuum(db_path=ingest.DB_PATH):
+    """
+    Give free pages (left by deletes and by Sql Manager's table rebuilds) back
+    to the file system. Databases without incremental auto_vacuum get one full
+    VACUUM that switches it on, once enough of the file is free to be worth it.
+    """
+    conn = ingest.connect(db_path)
+    try:
+        pages = conn.execute("PRAGMA page_count").fetchone()[0]
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if not free:
+            return "no free pages"
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            conn.execute("PRAGMA incremental_vacuum").fetchall()  # frees one page per row stepped
+            return f"{free} of {pages} pages released"
+        if free < pages * VACUUM_FREE_RATIO:
+            return f"{free} of {pages} pages free, below the full VACUUM threshold"
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")  # takes effect with this VACUUM
+        full_vacuum(conn)
+    finally:
+        conn.close()
+    return f"full VACUUM released {free} of {pages} pages; incremental from now on"
+
+
+def tasks(db_path=ingest.DB_PATH, retention_months=RETENTION_MONTHS):
+    """(name, seconds between runs, callable) in the order a run goes through them"""
+    return [
+        ("checkpoint", CHECKPOINT_SECONDS, lambda: checkpoint(db_path)),
+        ("optimize", OPTIMIZE_SECONDS, lambda: optimize(db_path)),
+        ("analyze", ANALYZE_SECONDS, lambda: analyze(db_path)),
+        # Before vacuum, so the pages it frees are released in the same run
+        ("retention", RETENTION_SECONDS, lambda: apply_retention(db_path, retention_months)),
+        ("vacuum", VACUUM_SECONDS, lambda: vacuum(db_path)),
+        # Keeps the analysts' snapshot fresh so their next query doesn't wait for the copy
+        ("snapshot", SNAPSHOT_SECONDS, lambda: snapshot.refresh_existing(db_path)),
+    ]
+
+
+def last_runs(db_path=ingest.DB_PATH):
+    """task -> (last_run, seconds, result, error)"""
+    conn = ingest.connect(db_path)
+    try:
+        create_runs_table(conn)
+        rows = conn.execute(f"SELECT task, last_run, seconds, result, error FROM {RUNS_TABLE}").fetchall()
+        conn.commit()
+    finally:
+        conn.close()
+    return {row[0]: row[1:] for row in rows}
+
+
+def save_run(db_path, task, seconds, result=None, error=None):
+    conn = ingest.connect(db_path)
+    try:
+        create_runs_table(conn)
+        conn.execute(
+            f"INSERT OR REPLACE INTO {RUNS_TABLE} (task, last_run, seconds, result, error) VALUES (?, ?, ?, ?, ?)",
+            (task, datetime.now().isoformat(timespec="seconds"), round(seconds, 3), result, error),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def run_due(db_path=ingest.DB_PATH, retention_months=RETENTION_MONTHS, force=False):
+    """
+    Run every task whose interval has passed since its last run (all of them
+    with force=True). A failing task is recorded and the others still run.
+    Returns {task: result or error}.
+    """
+    previous = last_runs(db_path)
+    now = datetime.now()
+    done = {}
+    for name, seconds, task in tasks(db_path, retention_months):
+        last_run = previous.get(name, (None,))[0]
+        if not force and last_run and (now - datetime.fromisoformat(last_run)).total_seconds() < seconds:
+            continue
+        started = time.perf_counter()
+        try:
+            result, error = task(), None
+        except Exception as e:
+            result, error = None, str(e)
+            print(f"Error in maintenance task {name}: {error}")
+        save_run(db_path, name, time.perf_counter() - started, result, error)
+        done[name] = error or result
+    return done
+
+
+def run_forever(interval=CHECK_SECONDS, db_path=ingest.DB_PATH, retention_months=RETENTION_MONTHS):
+    while True:
+        started = time.monotonic()
+        run_due(db_path, retention_months)
+        time.sleep(max(0, interval - (time.monotonic() - started)))
+
+
+def start_background(interval=CHECK_SECONDS, db_path=ingest.DB_PATH, retention_months=RETENTION_MONTHS):
+    """Start the maintenance thread once per server process, like poller.start_background"""
+    global _thread
+    with _lock:
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target=run_forever, args=(interval, db_path, retention_months), daemon=True)
+            _thread.start()
+    return _thread
+
+
+if __name__ == "__main__":
+    # Standalone mode, e.g. a nightly `python maintenance.py --once` from cron
+    parser = argparse.ArgumentParser(description="Checkpoint, optimize, vacuum and trim chai.db on a schedule")
+    parser.add_argument("--db", default=ingest.DB_PATH)
+    parser.add_argument("--interval", type=int, default=CHECK_SECONDS, help="seconds between checks for due tasks")
+    parser.add_argument("--retention-months", type=int, default=RETENTION_MONTHS,
+                        help="months of consultations kept in SQLite (default 0 keeps everything)")
+    parser.add_argument("--once", action="store_true", help="run the due tasks a single time and exit")
+    parser.add_argument("--force", action="store_true", help="with --once, run every task whether due or not")
+    args = parser.parse_args()
+    if args.once:
+        for name, outcome in run_due(args.db, args.retention_months, args.force).items():
+            print(f"{name}: {outcome}")
+    else:
+        run_forever(args.interval, args.db, args.retention_months)
@@ -0,0 +1,187 @@
+import sqlite3
+import threading
+from datetime import datetime
+import ingest
+import maintenance
+import rollup
+import sister_search
+from ingest import quote
+
+VERSION_TABLE = "schema_migrations"
+
+# Indexes every deployment should have in the current layout: (name, table, columns)
+INDEXES = [
+    ("ix_call_facts_date", "call_facts", ["Date"]),
+    ("ix_call_facts_region_date", "call_facts", ["region_id", "Date"]),
+    ("ix_call_facts_nurse_date", "call_facts", ["nurse_id", "Date"]),
+    ("ix_call_facts_doctor_date", "call_facts", ["doctor_id", "Date"]),
+    ("ix_users_email", "users", ["email"]),
+    ("ix_sisters_sistername", "sisters", ["sistername"]),
+]
+
+_done = set()
+_lock = threading.Lock()
+
+
+def create_users_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            userid INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            mobile TEXT,
+            email TEXT,
+            post TEXT,
+            RegionalUnit TEXT,
+            password TEXT
+        )
+    """)
+
+
+def create_sisters_table(conn):
+    # Same layout as sister_management.sister_menu creates
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sisters (
+            sistername TEXT,
+            mobile TEXT PRIMARY KEY,
+            email TEXT,
+            RegionalUnit TEXT,
+            MIName TEXT,
+            Designation TEXT,
+            state TEXT,
+            status TEXT,
+            remarks TEXT
+        )
+    """)
+
+
+def create_lookup_tables(conn):
+    create_users_table(conn)
+    create_sisters_table(conn)
+
+
+def create_calls_table(conn):
+    # The API decides the full column list; the first load adds the rest
+    ingest.ensure_calls_table(conn, ingest.REQUIRED_COLUMNS + ["doctorName"])
+
+
+def convert_to_star(conn):
+    # Moves an existing daily_calls table into call_facts and its dimensions
+    create_calls_table(conn)
+    create_indexes(conn)
+
+
+def create_call_triggers(conn):
+    ingest.recreate_calls_view(conn)
+    # Rows deleted by hand before the triggers kept the rollup right are still counted there
+    rollup.rebuild(conn)
+
+
+def create_index(conn, name, table, columns):
+    """Create one index, skipping it while the table lacks any of its columns"""
+    existing = ingest.table_columns(conn, table)
+    if not all(col in existing for col in columns):
+        return False
+    cols = ", ".join(quote(c) for c in columns)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {quote(table)} ({cols})")
+    return True
+
+
+def create_indexes(conn):
+    for name, table, columns in INDEXES:
+        create_index(conn, name, table, columns)
+    conn.execute("ANALYZE")  # give the planner row counts for the new indexes
+
+
+# Applied in order, each exactly once; append new steps, never edit old ones
+MIGRATIONS = [
+    (1, "users and sisters tables", create_lookup_tables),
+    (2, "daily_calls table with unique Consultation ID", create_calls_table),
+    (3, "filter and lookup indexes", create_indexes),
+    (4, "call_rollup counted from existing daily_calls", rollup.rebuild),
+    (5, "dimension tables, call_facts and the daily_calls view", convert_to_star),
+    (6, "trigram full-text index over sisters", sister_search.create_sister_index),
+    (7, "declared types and parsed values for call_facts", ingest.retype_calls_table),
+    (8, "phone numbers without a float '.0' and merged duplicate doctors", ingest.clean_phone_numbers),
+    (9, "daily_calls update trigger; deletes and edits by hand keep the rollup current", create_call_triggers),
+]
+# Steps that free a lot of pages; the file only shrinks after a VACUUM
+VACUUM_AFTER = {5, 7}
+
+
+def create_version_table(conn):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {VERSION_TABLE} (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TEXT
+        )
+    """)
+
+
+def current_version(conn):
+    create_version_table(conn)
+    return conn.execute(f"SELECT COALESCE(MAX(version), 0) FROM {VERSION_TABLE}").fetchone()[0]
+
+
+def migrate(db_path=ingest.DB_PATH):
+    """
+    Bring the database up to the latest schema version. Each migration runs in
+    its own transaction together with its version row, so a failed step is
+    retried on the next start. Returns the versions applied.
+    """
+    applied = []
+    conn = ingest.connect(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        version = current_version(conn)
+        conn.commit()
+        for number, description, step in MIGRATIONS:
+            if number <= version:
+                continue
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Another process may have migrated while we waited for the lock
+                if current_version(conn) >= number:
+                    conn.rollback()
+                    continue
+                step(conn)
+                conn.execute(
+                    f"INSERT INTO {VERSION_TABLE} (version, description, applied_at) VALUES (?, ?, ?)",
+                    (number, description, datetime.now().isoformat(timespec="seconds")),
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            applied.append(number)
+            if number in VACUUM_AFTER:
+                maintenance.full_vacuum(conn)
+
+        # Indexes and triggers are lost when a table is rebuilt (e.g. Sql
+        # Manager's drop or rename column), so put back any that have gone missing
+        conn.execute("BEGIN IMMEDIATE")
+        for name, table, columns in INDEXES:
+            create_index(conn, name, table, columns)
+        sister_search.ensure_sister_index(conn)
+        conn.commit()
+    finally:
+        conn.close()
+    return applied
+
+
+def migrate_once(db_path=ingest.DB_PATH):
+    """Run migrate() the first time it is called in this process; Streamlit reruns skip it"""
+    with _lock:
+        if db_path in _done:
+            return []
+        try:
+            applied = migrate(db_path)
+        except sqlite3.Error as e:
+            print(f"Error migrating {db_path}: {e}")
+            return []
+        _done.add(db_path)
+    return applied
+
+
+if __name__ == "__main__":
+    print(migrate())
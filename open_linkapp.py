@@ -1,9 +1,10 @@
 import streamlit as st
 import sqlite3
+import db
 
 # Connect to SQLite database
 def get_connection():
-    return sqlite3.connect('chai.db')
+    return db.get_connection()
 
 # Create table if it doesn't exist
 def create_table():
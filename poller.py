@@ -0,0 +1,219 @@
+import argparse
+import hashlib
+import tempfile
+import threading
+import time
+from datetime import datetime
+import ingest
+import ledger
+import backfill as bf
+
+TODAY_URL = f"{bf.API_BASE}/getTodayCallLogsCSV"
+POLL_SECONDS = 300
+STATUS_TABLE = "sync_status"
+CACHE_TABLE = "fetch_cache"
+SPOOL_BYTES = 8 * 1024 * 1024  # payloads larger than this spill to a temp file
+SOURCE = "today"
+
+_thread = None
+_lock = threading.Lock()
+
+
+def create_status_table(conn):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {STATUS_TABLE} (
+            source TEXT PRIMARY KEY,
+            last_run TEXT,
+            rows INTEGER,
+            inserted INTEGER,
+            updated INTEGER,
+            error TEXT
+        )
+    """)
+
+
+def create_cache_table(conn):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CACHE_TABLE} (
+            url TEXT PRIMARY KEY,
+            content_hash TEXT,
+            etag TEXT,
+            last_modified TEXT,
+            fetched_at TEXT
+        )
+    """)
+
+
+def get_fetch_cache(db_path, url):
+    """(content_hash, etag, last_modified) stored for url, or Nones"""
+    conn = ingest.connect(db_path)
+    try:
+        create_cache_table(conn)
+        row = conn.execute(
+            f"SELECT content_hash, etag, last_modified FROM {CACHE_TABLE} WHERE url = ?", (url,)
+        ).fetchone()
+    finally:
+        conn.close()
+    return row or (None, None, None)
+
+
+def save_fetch_cache(db_path, url, content_hash, etag, last_modified):
+    conn = ingest.connect(db_path)
+    try:
+        create_cache_table(conn)
+        conn.execute(
+            f"INSERT OR REPLACE INTO {CACHE_TABLE} (url, content_hash, etag, last_modified, fetched_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (url, content_hash, etag, last_modified, datetime.now().isoformat(timespec="seconds")),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def fetch_if_changed(session, url, db_path):
+    """
+    Conditional GET of url. Returns (payload, content_hash, etag, last_modified),
+    where payload is None when the server answers 304 or the body hashes the
+    same as last time, otherwise a rewound temp file holding the body.
+    """
+    cached_hash, etag, last_modified = get_fetch_cache(db_path, url)
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    response = session.get(url, headers=headers, stream=True, timeout=bf.TIMEOUT)
+    if response.status_code == 304:
+        return None, cached_hash, etag, last_modified
+    response.raise_for_status()
+
+    digest = hashlib.sha256()
+    payload = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+    for block in response.iter_content(64 * 1024):
+        digest.update(block)
+        payload.write(block)
+    content_hash = digest.hexdigest()
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    if content_hash == cached_hash:
+        payload.close()
+        return None, content_hash, etag, last_modified
+    payload.seek(0)
+    return payload, content_hash, etag, last_modified
+
+
+def save_status(db_path, rows=0, counts=None, error=None):
+    counts = counts or {}
+    conn = ingest.connect(db_path)
+    try:
+        create_status_table(conn)
+        conn.execute(
+            f"INSERT OR REPLACE INTO {STATUS_TABLE} (source, last_run, rows, inserted, updated, error) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (SOURCE, datetime.now().isoformat(timespec="seconds"), rows,
+             counts.get("inserted", 0), counts.get("updated", 0), error),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def touch_status(db_path):
+    """Record a poll that found nothing new, keeping the last row counts"""
+    conn = ingest.connect(db_path)
+    try:
+        create_status_table(conn)
+        conn.execute(
+            f"UPDATE {STATUS_TABLE} SET last_run = ?, error = NULL WHERE source = ?",
+            (datetime.now().isoformat(timespec="seconds"), SOURCE),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def get_status(db_path=ingest.DB_PATH):
+    """Last poll result as a dict, or None if the poller has never run"""
+    conn = ingest.connect(db_path)
+    try:
+        create_status_table(conn)
+        row = conn.execute(
+            f"SELECT last_run, rows, inserted, updated, error FROM {STATUS_TABLE} WHERE source = ?",
+            (SOURCE,),
+        ).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    return dict(zip(["last_run", "rows", "inserted", "updated", "error"], row))
+
+
+def poll_once(session=None, url=TODAY_URL, db_path=ingest.DB_PATH):
+    """
+    Download today's call log once and upsert it; only new or changed rows are
+    written. An unchanged payload (304 or same content hash) is not parsed at all.
+    """
+    session = session or bf.make_session()
+    rows, counts, error = 0, None, None
+    try:
+        started = time.perf_counter()
+        payload, content_hash, etag, last_modified = fetch_if_changed(session, url, db_path)
+        if payload is None:
+            touch_status(db_path)
+            return rows, counts, error
+        with payload, ledger.Batch(SOURCE, db_path) as batch:
+            batch.timings["download"] = time.perf_counter() - started
+            payload.seek(0, 2)
+            batch.bytes = payload.tell()
+            payload.seek(0)
+            conn = ingest.connect(db_path)
+            try:
+                batch.rows, batch.counts = ingest.load_calls(conn, payload, timings=batch.timings,
+                                                              date_format=ingest.API_DATE_FORMAT)
+            finally:
+                conn.close()
+            rows, counts = batch.rows, batch.counts
+        # Only remember the hash once its rows are safely in the database
+        save_fetch_cache(db_path, url, content_hash, etag, last_modified)
+    except Exception as e:
+        error = str(e)
+        print(f"Error polling today's call log: {error}")
+    save_status(db_path, rows, counts, error)
+    return rows, counts, error
+
+
+def run_forever(interval=POLL_SECONDS, url=TODAY_URL, db_path=ingest.DB_PATH):
+    session = bf.make_session()
+    while True:
+        started = time.monotonic()
+        poll_once(session, url, db_path)
+        time.sleep(max(0, interval - (time.monotonic() - started)))
+
+
+def start_background(interval=POLL_SECONDS, url=TODAY_URL, db_path=ingest.DB_PATH):
+    """
+    Start the polling thread once per server process. Streamlit reruns and new
+    sessions reuse the already-imported module, so they all share this thread.
+    """
+    global _thread
+    with _lock:
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target=run_forever, args=(interval, url, db_path), daemon=True)
+            _thread.start()
+    return _thread
+
+
+if __name__ == "__main__":
+    # Standalone mode, e.g. `python poller.py --interval 120` next to the Streamlit server
+    parser = argparse.ArgumentParser(description="Poll today's call log into chai.db")
+    parser.add_argument("--interval", type=int, default=POLL_SECONDS, help="seconds between polls")
+    parser.add_argument("--url", default=TODAY_URL)
+    parser.add_argument("--db", default=ingest.DB_PATH)
+    parser.add_argument("--once", action="store_true", help="poll a single time and exit")
+    args = parser.parse_args()
+    if args.once:
+        print(poll_once(url=args.url, db_path=args.db))
+    else:
+        run_forever(args.interval, args.url, args.db)
@@ -0,0 +1,108 @@
+import argparse
+import threading
+import time
+from datetime import date
+import data_cache
+import db
+import rollup
+
+CHECK_SECONDS = 30  # how often the warming thread looks for a new data generation
+
+_thread = None
+_lock = threading.Lock()
+
+
+def regional_units(db_path=db.DB_PATH):
+    """Regional units of the RPO logins (users whose RegionalUnit is not "All")"""
+    conn = db.get_connection(db_path)
+    try:
+        rows = conn.execute("""
+            SELECT DISTINCT RegionalUnit FROM users
+            WHERE RegionalUnit IS NOT NULL AND RegionalUnit NOT IN ('', 'All')
+            ORDER BY RegionalUnit
+        """).fetchall()
+    finally:
+        conn.close()
+    return [row[0] for row in rows]
+
+
+# Selections are sorted before they reach the cache, so picking the same
+# values in a different order reuses the same entry
+
+def options(region, start_date, end_date, months=(), db_path=db.DB_PATH):
+    """Sidebar options of rpodash for one regional unit: month numbers, regions, nurses and dates"""
+    months = sorted(months)
+    filters = {"RegionalUnit": [region]}
+    return {
+        "months": rollup.distinct_values("month_num", start_date, end_date, None, filters, db_path),
+        "regions": rollup.distinct_values("RegionalUnit", start_date, end_date, None, filters, db_path),
+        # Nurses and dates are only offered once a month is picked, like the panels
+        "nurses": rollup.distinct_values("Nurse Name", start_date, end_date, months, filters, db_path) if months else [],
+        "dates": rollup.distinct_values("Date", start_date, end_date, months, filters, db_path) if months else [],
+    }
+
+
+def panels(region, start_date, end_date, months, regions=(), nurses=(), dates=(), db_path=db.DB_PATH):
+    """Every rpodash panel for one regional unit and set of selections (see rollup.panel_counts)"""
+    return rollup.panel_counts(start_date, end_date, sorted(months), sorted(regions), sorted(nurses), None,
+                               sorted(dates), region=region, db_path=db_path)
+
+
+def default_windows(today=None):
+    """
+    (start, end) date windows an RPO is likely to open first: today (what the
+    date pickers start on) and the month so far
+    """
+    today = today or date.today()
+    return [(today.isoformat(), today.isoformat()), (today.replace(day=1).isoformat(), today.isoformat())]
+
+
+def warm(db_path=db.DB_PATH, today=None):
+    """
+    Compute the sidebar options and panels of every regional unit for the
+    default windows and the current month, so the first dashboard of each RPO
+    is served from the cache. Returns the number of summaries computed.
+    """
+    today = today or date.today()
+    done = 0
+    for region in regional_units(db_path):
+        for start_date, end_date in default_windows(today):
+            options(region, start_date, end_date, db_path=db_path)
+            options(region, start_date, end_date, [today.month], db_path)
+            panels(region, start_date, end_date, [today.month], db_path=db_path)
+            done += 1
+    return done
+
+
+def run_forever(interval=CHECK_SECONDS, db_path=db.DB_PATH):
+    """Warm the cache whenever the data generation (bumped by every load that changes data) or the day moves on"""
+    warmed = None
+    while True:
+        started = time.monotonic()
+        try:
+            current = (data_cache.generation(db_path), date.today())
+            if current != warmed:
+                warm(db_path, current[1])
+                warmed = current
+        except Exception as e:
+            print(f"Error warming regional dashboards: {e}")
+        time.sleep(max(0, interval - (time.monotonic() - started)))
+
+
+def start_background(interval=CHECK_SECONDS, db_path=db.DB_PATH):
+    """Start the warming thread once per server process; the cache it fills is the process-wide one"""
+    global _thread
+    with _lock:
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target=run_forever, args=(interval, db_path), daemon=True)
+            _thread.start()
+    return _thread
+
+
+if __name__ == "__main__":
+    # Times a warm-up; a separate process has its own cache, so this doesn't serve the dashboards
+    parser = argparse.ArgumentParser(description="Precompute the RPO dashboards of every regional unit")
+    parser.add_argument("--db", default=db.DB_PATH)
+    args = parser.parse_args()
+    started = time.perf_counter()
+    print(f"{warm(args.db)} summaries in {time.perf_counter() - started:.2f}s")
@@ -1,5 +1,5 @@
 import streamlit as st
-import sqlite3
+import db
 from datetime import datetime, date, timedelta
 import pandas as pd
 import smtplib
@@ -15,7 +15,7 @@ RECEIVER_EMAIL = "jean-toms@chai-india.org"
 
 # Initialize database
 def init_db():
-    conn = sqlite3.connect('reminder.db')
+    conn = db.get_connection('reminder.db')
     c = conn.cursor()
     c.execute('''
         CREATE TABLE IF NOT EXISTS reminders (
@@ -51,7 +51,7 @@ def send_email(subject, body, to_email=RECEIVER_EMAIL):
 def check_reminders():
     while True:
         try:
-            conn = sqlite3.connect('reminder.db')
+            conn = db.get_connection('reminder.db')
             c = conn.cursor()
             current_time = datetime.now()
             current_date = current_time.strftime('%Y-%m-%d')
@@ -90,7 +90,7 @@ def init_notification_thread():
         st.session_state.notification_thread = thread
         
 def update_reminder(id, task, date_obj, time_obj):
-    conn = sqlite3.connect('reminder.db')
+    conn = db.get_connection('reminder.db')
     c = conn.cursor()
     date_str = date_obj.strftime('%Y-%m-%d')
     time_str = time_obj.strftime('%H:%M')
@@ -99,14 +99,14 @@ def update_reminder(id, task, date_obj, time_obj):
     conn.close()
 
 def delete_reminder(id):
-    conn = sqlite3.connect('reminder.db')
+    conn = db.get_connection('reminder.db')
     c = conn.cursor()
     c.execute('DELETE FROM reminders WHERE id = ?', (id,))
     conn.commit()
     conn.close()
 
 def get_all_reminders():
-    conn = sqlite3.connect('reminder.db')
+    conn = db.get_connection('reminder.db')
     df = pd.read_sql_query('SELECT id, task, date, time, completed FROM reminders ORDER BY date DESC, time', conn)
     if not df.empty:
         df['date'] = pd.to_datetime(df['date']).dt.date
@@ -124,7 +124,7 @@ def reminder():
     if menu == 'Todays Tasks':
         st.subheader("Today's Tasks")
         today = date.today()
-        conn = sqlite3.connect('reminder.db')
+        conn = db.get_connection('reminder.db')
         df = pd.read_sql_query('SELECT id, task, time, completed FROM reminders WHERE date = ? ORDER BY time', conn, params=(today.strftime('%Y-%m-%d'),))
         if not df.empty:
             df['time'] = pd.to_datetime(df['time'], format='%H:%M').dt.time
@@ -142,7 +142,7 @@ def reminder():
                 with col3:
                     done = st.button('✅ Done' if not row['completed'] else '↩️ Undo', key=f'done_{row["id"]}')
                     if done:
-                        conn = sqlite3.connect('reminder.db')
+                        conn = db.get_connection('reminder.db')
                         c = conn.cursor()
                         c.execute('UPDATE reminders SET completed = ? WHERE id = ?', (not row['completed'], row['id']))
                         conn.commit()
@@ -184,7 +184,7 @@ def reminder():
             
             if st.form_submit_button('Add Reminder'):
                 if task:
-                    conn = sqlite3.connect('reminder.db')
+                    conn = db.get_connection('reminder.db')
                     c = conn.cursor()
                     c.execute('INSERT INTO reminders (task, date, time) VALUES (?, ?, ?)', (task, reminder_date.strftime('%Y-%m-%d'), reminder_time.strftime('%H:%M')))
                     conn.commit()
@@ -0,0 +1,271 @@
+import calendar
+import db
+import numpy as np
+import pandas as pd
+import archive
+import data_cache
+import ingest
+
+ROLLUP_TABLE = "call_rollup"
+# One row per day and combination of these, so every dashboard filter can be
+# answered from the rollup without touching the raw consultations
+DIMENSIONS = ["Date", "RegionalUnit", "Nurse Name", "doctorName", "Hospital", "Status_Final"]
+
+
+def create_rollup_table(conn):
+    cols = ", ".join(f"{ingest.quote(c)} TEXT" for c in DIMENSIONS)
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {ROLLUP_TABLE} ({cols}, calls INTEGER)")
+    conn.execute(f'CREATE INDEX IF NOT EXISTS ix_{ROLLUP_TABLE}_date ON {ROLLUP_TABLE} ("Date")')
+    conn.execute(f'CREATE INDEX IF NOT EXISTS ix_{ROLLUP_TABLE}_region_date ON {ROLLUP_TABLE} (RegionalUnit, "Date")')
+
+
+def dimension_select(conn):
+    # daily_calls may not have every dimension yet (e.g. no Hospital column)
+    existing = ingest.table_columns(conn, ingest.CALLS_TABLE)
+    return ", ".join(ingest.quote(c) if c in existing else f"NULL AS {ingest.quote(c)}" for c in DIMENSIONS)
+
+
+def refresh_days(conn, days):
+    """
+    Recount the given days from daily_calls into the rollup. Runs inside the
+    caller's transaction, so the rollup is published together with the rows.
+    """
+    days = sorted({d for d in days if d})
+    if not days:
+        return 0
+    create_rollup_table(conn)
+    dims = ", ".join(ingest.quote(c) for c in DIMENSIONS)
+    select = dimension_select(conn)
+    for day in days:
+        conn.execute(f'DELETE FROM {ROLLUP_TABLE} WHERE "Date" = ?', (day,))
+        conn.execute(f"""
+            INSERT INTO {ROLLUP_TABLE} ({dims}, calls)
+            SELECT {select}, COUNT(*) FROM {ingest.quote(ingest.CALLS_TABLE)}
+            WHERE "Date" = ?
+            GROUP BY {dims}
+        """, (day,))
+    return len(days)
+
+
+def count_sql(conn, row, change):
+    """
+    Statements for a daily_calls trigger that count row (OLD or NEW) out of
+    (change -1) or into (change +1) its rollup group, so edits by hand keep
+    the rollup right without recounting the day
+    """
+    existing = ingest.table_columns(conn, ingest.CALLS_TABLE)
+    values = [f"{row}.{ingest.quote(c)}" if c in existing else "NULL" for c in DIMENSIONS]
+    match = " AND ".join(f"{ingest.quote(c)} IS {v}" for c, v in zip(DIMENSIONS, values))
+    statements = [f"UPDATE {ROLLUP_TABLE} SET calls = calls + {change} WHERE {match}"]
+    if change < 0:
+        statements.append(f"DELETE FROM {ROLLUP_TABLE} WHERE calls <= 0 AND {match}")
+    else:
+        dims = ", ".join(ingest.quote(c) for c in DIMENSIONS)
+        statements.append(f"""
+            INSERT INTO {ROLLUP_TABLE} ({dims}, calls) SELECT {', '.join(values)}, 1
+            WHERE {row}."Date" IS NOT NULL AND NOT EXISTS (SELECT 1 FROM {ROLLUP_TABLE} WHERE {match})
+        """)
+    return statements
+
+
+def rebuild(conn):
+    """
+    Recount every day; for databases filled before the rollup existed or edited
+    by hand. Months moved to the Parquet archive keep their counts.
+    """
+    create_rollup_table(conn)
+    cold = archive.cold_months(conn)
+    conn.execute(f'DELETE FROM {ROLLUP_TABLE} WHERE substr("Date", 1, 7) NOT IN ({", ".join("?" * len(cold))})',
+                 sorted(cold))
+    data_cache.bump_generation(conn)
+    if not ingest.table_columns(conn, ingest.CALLS_TABLE):
+        return 0
+    days = [row[0] for row in conn.execute(f'SELECT DISTINCT "Date" FROM {ingest.quote(ingest.CALLS_TABLE)}')]
+    return refresh_days(conn, [d for d in days if d and d[:7] not in cold])
+
+
+MONTH_NUM = "CAST(strftime('%m', \"Date\") AS INTEGER)"
+
+
+# Index 1-12 -> month name, so month numbers map to names in one vectorised lookup
+MONTH_NAMES = pd.Series(list(calendar.month_name))
+
+
+def add_month_name(df):
+    df["month_name"] = df["month_num"].map(MONTH_NAMES)
+    return df
+
+
+def filter_clause(start_date=None, end_date=None, months=None, filters=None):
+    """
+    (WHERE ..., params) for rollup rows between two YYYY-MM-DD dates, in the
+    given calendar months (1-12, any year) and matching filters, a dict of
+    column -> accepted values. An empty selection does not filter.
+    """
+    clauses, params = [], []
+    if start_date:
+        clauses.append('"Date" >= ?')
+        params.append(start_date)
+    if end_date:
+        clauses.append('"Date" <= ?')
+        params.append(end_date)
+    if months:
+        clauses.append(f"{MONTH_NUM} IN ({', '.join('?' * len(months))})")
+        params += [int(m) for m in months]
+    for column, values in (filters or {}).items():
+        if values:
+            clauses.append(f"{ingest.quote(column)} IN ({', '.join('?' * len(values))})")
+            params += list(values)
+    return (f"WHERE {' AND '.join(clauses)}" if clauses else ""), params
+
+
+@data_cache.cached
+def load_rollup(start_date=None, end_date=None, region=None, db_path="chai.db"):
+    """
+    Rollup rows (DIMENSIONS plus calls) between two YYYY-MM-DD dates, optionally
+    for one RegionalUnit, with month_num/month_name/year added for the filters.
+    """
+    where, params = filter_clause(start_date, end_date, filters={"RegionalUnit": [region] if region else None})
+    conn = db.get_connection(db_path)
+    try:
+        create_rollup_table(conn)
+        df = pd.read_sql_query(f"SELECT * FROM {ROLLUP_TABLE} {where}", conn, params=params)
+    finally:
+        conn.close()
+    dates = pd.to_datetime(df["Date"], errors="coerce")
+    df["year"] = dates.dt.year
+    df["month_num"] = dates.dt.month
+    return add_month_name(df)
+
+
+@data_cache.cached
+def distinct_values(column, start_date=None, end_date=None, months=None, filters=None, db_path="chai.db"):
+    """Sorted values of a rollup column (or "month_num") present in the filtered rows, for filter options"""
+    expr = MONTH_NUM if column == "month_num" else ingest.quote(column)
+    where, params = filter_clause(start_date, end_date, months, filters)
+    where = f"{where} AND {expr} IS NOT NULL" if where else f"WHERE {expr} IS NOT NULL"
+    conn = db.get_connection(db_path)
+    try:
+        create_rollup_table(conn)
+        rows = conn.execute(f"SELECT DISTINCT {expr} FROM {ROLLUP_TABLE} {where} ORDER BY 1", params).fetchall()
+    finally:
+        conn.close()
+    return [row[0] for row in rows]
+
+
+# Finest grain any dashboard panel needs
+PANEL_COLUMNS = ["Date", "RegionalUnit", "Nurse Name", "doctorName"]
+
+
+def encode_panel_frame(df):
+    """
+    Categorical dimension columns plus month_num/month_name derived from the
+    distinct dates only (not row by row); month_name keeps calendar order.
+    """
+    for col in PANEL_COLUMNS:
+        df[col] = df[col].astype("category")
+    # Month of each distinct date (-1 if unparseable), then spread to the rows by their date codes
+    dates = df["Date"].cat.categories
+    month_of_date = pd.to_numeric(pd.Series(dates.str[5:7]), errors="coerce").fillna(0).astype(int).to_numpy() - 1
+    month_of_date[(month_of_date < 0) | (month_of_date > 11)] = -1
+    codes = df["Date"].cat.codes.to_numpy()
+    month_codes = np.where(codes >= 0, month_of_date[codes], -1) if len(dates) else np.full(len(df), -1)
+    df["month_name"] = pd.Categorical.from_codes(month_codes, categories=list(calendar.month_name)[1:])
+    df["month_num"] = np.where(month_codes >= 0, month_codes + 1, np.nan)
+    return df
+
+
+def panel_series(df, column):
+    """Calls per value of column, largest first, with a plain index"""
+    counts = df.groupby(column, observed=True)["calls"].sum().sort_values(ascending=False)
+    counts.index = counts.index.astype(object)
+    return counts
+
+
+def panel_table(df, index, columns, sort_by_total=True):
+    """Calls per index x columns plus a Total column (what call_pivot + Total gave), with plain labels"""
+    table = df.groupby([index, columns], observed=True)["calls"].sum().unstack(fill_value=0)
+    table.index = table.index.astype(object)
+    table.columns = table.columns.astype(object)
+    table.columns.name = columns
+    table["Total"] = table.sum(axis=1)
+    return table.sort_values("Total", ascending=False) if sort_by_total else table
+
+
+@data_cache.cached
+def panel_frame(start_date, end_date, months, region=None, db_path="chai.db"):
+    """
+    Rollup rows of the selected period (of one RegionalUnit if given) with just
+    the panel columns, encoded by encode_panel_frame. Not grouped in SQL:
+    sorting the text columns there costs more than summing the categorical
+    codes in pandas. Cached on its own, so changing the other sidebar filters
+    doesn't read SQLite again.
+    """
+    where, params = filter_clause(start_date, end_date, months, {"RegionalUnit": [region] if region else None})
+    cols = ", ".join(ingest.quote(c) for c in PANEL_COLUMNS)
+    conn = db.get_connection(db_path)
+    try:
+        create_rollup_table(conn)
+        df = pd.read_sql_query(f"SELECT {cols}, calls FROM {ROLLUP_TABLE} {where}", conn, params=params)
+    finally:
+        conn.close()
+    return encode_panel_frame(df)
+
+
+@data_cache.cached
+def panel_counts(start_date, end_date, months, regions=None, nurses=None, doctors=None, dates=None,
+                 region=None, db_path="chai.db"):
+    """
+    Every dash.dashboard panel for one set of sidebar selections, computed
+    together from a single read of the period (panel_frame): each panel is a
+    slice of it summed over categorical codes. region limits everything to one
+    RegionalUnit (rpodash). Returns a dict of totals, Series (month_counts,
+    region_counts, ...) and tables (region_monthly, ...).
+    """
+    base = panel_frame(start_date, end_date, months, region, db_path)
+
+    def pick(column, values):
+        return base[base[column].isin(values)] if values else base
+
+    region_df = pick("RegionalUnit", regions)
+    nurse_df = pick("Nurse Name", nurses)
+    if regions:
+        nurse_df = nurse_df[nurse_df["RegionalUnit"].isin(regions)]
+    doctor_df = pick("doctorName", doctors)
+    date_df = pick("Date", dates)
+
+    month_counts = panel_series(base, "month_name")
+    return {
+        "total": int(base["calls"].sum()),
+        "active_sisters": base["Nurse Name"].nunique(dropna=False) if len(base) else 0,
+        "month_counts": month_counts.reindex([m for m in calendar.month_name[1:] if m in month_counts.index]),
+        "region_counts": panel_series(region_df, "RegionalUnit"),
+        "region_monthly": panel_table(region_df, "RegionalUnit", "month_name"),
+        "nurse_counts": panel_series(nurse_df, "Nurse Name"),
+        "nurse_monthly": panel_table(nurse_df, "Nurse Name", "month_name"),
+        "doctor_counts": panel_series(doctor_df, "doctorName"),
+        "doctor_monthly": panel_table(doctor_df, "doctorName", "month_name"),
+        "date_counts": panel_series(date_df, "Date"),
+        "date_monthly": panel_table(date_df, "Date", "RegionalUnit", sort_by_total=False),
+        "performance": panel_table(date_df, "Nurse Name", "Date"),
+    }
+
+
+def call_counts(df, column):
+    """Calls per value of column, largest first (what value_counts gave on raw rows)"""
+    return df.groupby(column)["calls"].sum().sort_values(ascending=False)
+
+
+def call_pivot(df, index, columns):
+    """Calls per index x columns (what pivot_table(aggfunc='count') gave on raw rows)"""
+    return pd.pivot_table(df, values="calls", index=index, columns=columns, aggfunc="sum", fill_value=0)
+
+
+if __name__ == "__main__":
+    conn = ingest.connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        print(f"Rebuilt {rebuild(conn)} days")
+        conn.commit()
+    finally:
+        conn.close()
@@ -1,24 +1,21 @@
 import streamlit as st
 import sqlite3
+import db
 import pandas as pd
+import sister_search
 
 ru=["CHAAP", "CHABIJAN", "CHAKA", "CHAKE", "CHAMP", "CHAT", "CHAW", "NECHA", "OCHA", "RUPCHA", "WEBCHA"]
 # Set page configuration
 def get_db_connection():
         try:
-            conn = sqlite3.connect('chai.db')
+            conn = db.get_connection()
             return conn
         except sqlite3.Error as e:
             st.error(f"Database connection error: {e}")
             return None
 def search_records_by_name(search_term):
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM sisters WHERE sistername LIKE ? OR mobile LIKE ?', 
-               (f'%{search_term}%', f'%{search_term}%'))
-        records = cursor.fetchall()
-        conn.close()
-        return records
+        # Ranked lookup through the trigram index instead of a LIKE scan
+        return sister_search.search_sisters(search_term)
 
 def modify_record_1(nm,mob,stat,rem):
         conn = get_db_connection()
@@ -89,7 +86,7 @@ def sister_menu():
     # Database connection function
     def get_db_connection():
         try:
-            conn = sqlite3.connect('chai.db')
+            conn = db.get_connection()
             return conn
         except sqlite3.Error as e:
             st.error(f"Database connection error: {e}")
@@ -182,11 +179,8 @@ def sister_menu():
             conn = get_db_connection()
             if conn:
                 try:
-                    sisters = pd.read_sql_query(
-                        "SELECT * FROM sisters WHERE sistername LIKE ? ORDER BY SisterName",
-                        conn,
-                        params=[f"%{search_term}%"]
-                    )
+                    query, params = sister_search.sister_search_query(search_term)
+                    sisters = pd.read_sql_query(query, conn, params=params)
                     if not sisters.empty:
                         st.dataframe(sisters)
                     else:
@@ -204,11 +198,8 @@ def sister_menu():
             conn = get_db_connection()
             if conn:
                 try:
-                    df = pd.read_sql_query(
-                        "SELECT * FROM sisters WHERE SisterName LIKE ? ORDER BY SisterName",
-                        conn,
-                        params=[f"%{search_name}%"]
-                    )
+                    query, params = sister_search.sister_search_query(search_name)
+                    df = pd.read_sql_query(query, conn, params=params)
                     
                     if not df.empty:
                         st.write("Found sisters:")
@@ -276,11 +267,8 @@ def sister_menu():
             conn = get_db_connection()
             if conn:
                 try:
-                    sisters = pd.read_sql_query(
-                        "SELECT * FROM sisters WHERE sistername LIKE ? ORDER BY sistername",
-                        conn,
-                        params=[f"%{search_name}%"]
-                    )
+                    query, params = sister_search.sister_search_query(search_name)
+                    sisters = pd.read_sql_query(query, conn, params=params)
                     
                     if not sisters.empty:
                         st.write("Found sisters:")
@@ -0,0 +1,92 @@
+import db
+
+FTS_TABLE = "sisters_fts"
+# sisters columns searched from the contact and sister screens
+FTS_COLUMNS = ["sistername", "mobile", "email", "MIName", "state"]
+# The trigram tokenizer only matches terms of at least three characters
+MIN_MATCH_LENGTH = 3
+
+
+def create_sister_index(conn):
+    """
+    Trigram FTS5 index over the sisters table (external content, so the text is
+    not stored twice) plus the triggers that keep it in step with every insert,
+    update and delete.
+    """
+    cols = ", ".join(FTS_COLUMNS)
+    new = ", ".join(f"new.{c}" for c in FTS_COLUMNS)
+    old = ", ".join(f"old.{c}" for c in FTS_COLUMNS)
+    conn.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+            {cols}, content='sisters', content_rowid='rowid', tokenize='trigram'
+        )
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS sisters_fts_insert AFTER INSERT ON sisters BEGIN
+            INSERT INTO {FTS_TABLE} (rowid, {cols}) VALUES (new.rowid, {new});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS sisters_fts_delete AFTER DELETE ON sisters BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, {cols}) VALUES ('delete', old.rowid, {old});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS sisters_fts_update AFTER UPDATE ON sisters BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, {cols}) VALUES ('delete', old.rowid, {old});
+            INSERT INTO {FTS_TABLE} (rowid, {cols}) VALUES (new.rowid, {new});
+        END
+    """)
+    rebuild(conn)
+
+
+def rebuild(conn):
+    """Re-read the whole index from sisters, e.g. after VACUUM renumbered its rowids"""
+    conn.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def ensure_sister_index(conn):
+    """
+    Recreate the index if it or a trigger is missing; rebuilding the sisters
+    table (e.g. Sql Manager's drop column) drops its triggers with it. Returns
+    True if anything had to be repaired.
+    """
+    names = {row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE name = ? OR tbl_name = 'sisters'", (FTS_TABLE,))}
+    if {FTS_TABLE, "sisters_fts_insert", "sisters_fts_delete", "sisters_fts_update"} <= names:
+        return False
+    if "sisters" not in names:
+        return False
+    create_sister_index(conn)
+    return True
+
+
+def sister_search_query(term, columns="s.*"):
+    """
+    (sql, params) selecting the sisters matching term in any indexed column,
+    best first: names starting with the term, then by bm25 rank. Works with
+    both cursor.execute and pd.read_sql_query.
+    """
+    term = term.strip()
+    if len(term) < MIN_MATCH_LENGTH:
+        # Too short for trigrams; a short LIKE over the directory is still cheap
+        where = " OR ".join(f"s.{c} LIKE ?" for c in FTS_COLUMNS)
+        sql = (f"SELECT {columns} FROM sisters s WHERE {where} "
+               f"ORDER BY s.sistername LIKE ? DESC, s.sistername")
+        return sql, [f"%{term}%"] * len(FTS_COLUMNS) + [f"{term}%"]
+    # One quoted phrase, so the term is matched as a substring and never parsed as FTS syntax
+    phrase = '"' + term.replace('"', '""') + '"'
+    sql = (f"SELECT {columns} FROM {FTS_TABLE} JOIN sisters s ON s.rowid = {FTS_TABLE}.rowid "
+           f"WHERE {FTS_TABLE} MATCH ? "
+           f"ORDER BY s.sistername LIKE ? DESC, {FTS_TABLE}.rank")
+    return sql, [phrase, f"{term}%"]
+
+
+def search_sisters(term, db_path="chai.db"):
+    """sisters rows (tuples, as SELECT * gives them) matching term, best first"""
+    sql, params = sister_search_query(term)
+    conn = db.get_connection(db_path)
+    try:
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
@@ -0,0 +1,98 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+import db
+import pandas as pd
+
+# Kept out of the working directory so the SQL tools don't list snapshots as databases
+SNAPSHOT_DIR = "snapshots"
+MAX_AGE_SECONDS = 3600  # older snapshots are refreshed before the next query
+
+_lock = threading.Lock()
+
+
+def snapshot_path(db_path, root=SNAPSHOT_DIR):
+    # The same file name can come from different folders (e.g. uploaded temp_db.db files)
+    digest = hashlib.sha1(os.path.abspath(db_path).encode()).hexdigest()[:8]
+    stem = os.path.splitext(os.path.basename(db_path))[0]
+    return os.path.join(root, f"{stem}-{digest}.db")
+
+
+def snapshot_time(db_path, root=SNAPSHOT_DIR):
+    """When the snapshot of db_path was taken, or None if there is none"""
+    path = snapshot_path(db_path, root)
+    return datetime.fromtimestamp(os.path.getmtime(path)) if os.path.exists(path) else None
+
+
+def refresh(db_path=db.DB_PATH, root=SNAPSHOT_DIR):
+    """
+    Copy db_path into its snapshot with the online backup API. The copy is
+    taken in one step inside a single read transaction: under WAL that never
+    blocks ingestion or dashboards, whereas a stepped copy would restart every
+    time a load commits. The new copy replaces the old one in a single rename.
+    Returns the snapshot path.
+    """
+    path = snapshot_path(db_path, root)
+    os.makedirs(root, exist_ok=True)
+    with _lock:
+        tmp = path + ".tmp"
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        # Unpooled, and the source's journal mode is left alone (it may be an uploaded file)
+        source = db.connect_external(db_path)
+        target = sqlite3.connect(tmp)
+        try:
+            source.backup(target)
+            # A rollback-journal file can be opened read-only without -wal/-shm files
+            target.execute("PRAGMA journal_mode = DELETE")
+        finally:
+            target.close()
+            source.close()
+        # Connections already open on the old snapshot keep reading it until they close
+        os.replace(tmp, path)
+    return path
+
+
+def connect(db_path=db.DB_PATH, max_age=MAX_AGE_SECONDS, root=SNAPSHOT_DIR):
+    """
+    Read-only connection to the snapshot of db_path, refreshing it first if it
+    is missing or older than max_age seconds. Not pooled: each refresh swaps
+    the file, and a pooled connection would keep reading the old one.
+    """
+    path = snapshot_path(db_path, root)
+    taken = snapshot_time(db_path, root)
+    if taken is None or time.time() - taken.timestamp() > max_age:
+        refresh(db_path, root)
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+    conn.execute("PRAGMA query_only = ON")
+    conn.execute("PRAGMA cache_size = -32768")
+    return conn
+
+
+def discard(db_path, root=SNAPSHOT_DIR):
+    """Delete the snapshot of db_path, e.g. when the database itself is removed"""
+    path = snapshot_path(db_path, root)
+    for name in (path, path + ".tmp"):
+        if os.path.exists(name):
+            os.remove(name)
+
+
+def refresh_existing(db_path=db.DB_PATH, root=SNAPSHOT_DIR):
+    """Refresh the snapshot of db_path only if one is in use (someone has queried it)"""
+    if snapshot_time(db_path, root) is None:
+        return "no snapshot in use"
+    started = time.perf_counter()
+    refresh(db_path, root)
+    return f"refreshed in {time.perf_counter() - started:.1f}s"
+
+
+def read_query(query, db_path=db.DB_PATH, params=None):
+    """Run a SELECT against the snapshot and return a DataFrame"""
+    conn = connect(db_path)
+    try:
+        return pd.read_sql_query(query, conn, params=params)
+    finally:
+        conn.close()
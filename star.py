@@ -0,0 +1,286 @@
+import archive
+import data_cache
+import db
+import pandas as pd
+import ingest
+import rollup
+
+FACT_TABLE = "call_facts"
+LEGACY_TABLE = "daily_calls_legacy"
+# Dimension table -> (integer key in call_facts, daily_calls columns it holds)
+DIMENSIONS = {
+    "dim_nurse": ("nurse_id", ["Nurse Name"]),
+    "dim_doctor": ("doctor_id", ["doctorName", "doctorEmail", "doctorPhone", "department"]),
+    "dim_hospital": ("hospital_id", ["Hospital"]),
+    "dim_region": ("region_id", ["RegionalUnit"]),
+}
+DIMENSION_OF = {col: dim for dim, (key, cols) in DIMENSIONS.items() for col in cols}
+
+
+def object_type(conn, name):
+    """'table', 'view' or None for a name in the main database"""
+    row = conn.execute("SELECT type FROM sqlite_master WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else None
+
+
+def create_dimension_tables(conn):
+    for dim, (key, cols) in DIMENSIONS.items():
+        defs = ", ".join(f"{ingest.quote(c)} TEXT" for c in cols)
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {dim} ({key} INTEGER PRIMARY KEY, {defs})")
+        conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS ux_{dim} ON {dim} ({', '.join(ingest.quote(c) for c in cols)})")
+
+
+def fact_columns(columns):
+    """daily_calls column list -> call_facts column list (dimension columns become one key each)"""
+    result = []
+    for col in columns:
+        dim = DIMENSION_OF.get(col)
+        col = DIMENSIONS[dim][0] if dim else col
+        if col not in result:
+            result.append(col)
+    return result
+
+
+def fact_types(conn):
+    # While converting, columns CALL_COLUMN_TYPES doesn't cover keep the old table's declared types
+    types = {row[1]: row[2] for row in conn.execute(f"PRAGMA table_info({LEGACY_TABLE})")}
+    types.update(ingest.calls_column_types(conn))
+    types.update({key: "INTEGER" for key, cols in DIMENSIONS.values()})
+    return types
+
+
+def create_view(conn):
+    """(Re)create daily_calls as call_facts joined back to its dimensions, in the original column order"""
+    select, joins = [], []
+    for col in ingest.table_columns(conn, FACT_TABLE):
+        dim = next((d for d, (key, cols) in DIMENSIONS.items() if key == col), None)
+        if dim:
+            select += [f"{dim}.{ingest.quote(c)}" for c in DIMENSIONS[dim][1]]
+            joins.append(f"LEFT JOIN {dim} ON {dim}.{col} = f.{col}")
+        else:
+            select.append(f"f.{ingest.quote(col)}")
+    conn.execute(f"DROP VIEW IF EXISTS {ingest.quote(ingest.CALLS_TABLE)}")
+    conn.execute(f"""
+        CREATE VIEW {ingest.quote(ingest.CALLS_TABLE)} AS
+        SELECT {', '.join(select)}
+        FROM {FACT_TABLE} f {' '.join(joins)}
+    """)
+    create_triggers(conn)
+
+
+def create_triggers(conn):
+    """
+    Let the SQL tools keep deleting and editing daily_calls rows by hand. The
+    change goes to call_facts (re-pointing edited dimension columns at their
+    member), and the rollup, archive state and cache generation follow it in
+    the same statement, as they do after a load.
+    """
+    view, key = ingest.quote(ingest.CALLS_TABLE), ingest.quote(ingest.KEY_COLUMN)
+    rollup.create_rollup_table(conn)
+    archive.create_state_table(conn)
+    data_cache.create_generation_table(conn)
+    upkeep = rollup.count_sql(conn, "OLD", -1)
+    assign = []
+    for col in ingest.table_columns(conn, FACT_TABLE):
+        dim = next((d for d, (k, cols) in DIMENSIONS.items() if k == col), None)
+        if not dim:
+            assign.append(f"{ingest.quote(col)} = NEW.{ingest.quote(col)}")
+            continue
+        cols = DIMENSIONS[dim][1]
+        match = " AND ".join(f"d.{ingest.quote(c)} IS NEW.{ingest.quote(c)}" for c in cols)
+        upkeep.append(f"""
+            INSERT INTO {dim} ({', '.join(ingest.quote(c) for c in cols)})
+            SELECT {', '.join(f"NEW.{ingest.quote(c)}" for c in cols)}
+            WHERE ({' OR '.join(f"NEW.{ingest.quote(c)} IS NOT NULL" for c in cols)})
+              AND NOT EXISTS (SELECT 1 FROM {dim} d WHERE {match})
+        """)
+        assign.append(f"{col} = (SELECT d.{col} FROM {dim} d WHERE {match})")
+    upkeep.append(f"UPDATE {FACT_TABLE} SET {', '.join(assign)} WHERE {key} IS OLD.{key}")
+    upkeep += rollup.count_sql(conn, "NEW", 1)
+    upkeep += [archive.mark_dirty_sql('OLD."Date"'), archive.mark_dirty_sql('NEW."Date"'), data_cache.BUMP_SQL]
+    conn.execute(f"""
+        CREATE TRIGGER {ingest.CALLS_TABLE}_delete INSTEAD OF DELETE ON {view}
+        BEGIN
+            {'; '.join(rollup.count_sql(conn, "OLD", -1))};
+            DELETE FROM {FACT_TABLE} WHERE {key} IS OLD.{key};
+            {archive.mark_dirty_sql('OLD."Date"')};
+            {data_cache.BUMP_SQL};
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER {ingest.CALLS_TABLE}_update INSTEAD OF UPDATE ON {view}
+        BEGIN
+            {'; '.join(upkeep)};
+        END
+    """)
+
+
+def ensure_layout(conn, columns):
+    """
+    Make sure call_facts has a column for every incoming daily_calls column and
+    that the daily_calls view exposes them. A plain daily_calls table left by an
+    older version is converted first.
+    """
+    if object_type(conn, ingest.CALLS_TABLE) == "table":
+        convert_legacy(conn)
+    create_dimension_tables(conn)
+    existing = ingest.table_columns(conn, FACT_TABLE)
+    wanted = fact_columns(columns)
+    types = fact_types(conn)
+    if not existing:
+        defs = ", ".join(ingest.column_def(c, types) for c in wanted)
+        conn.execute(f"CREATE TABLE {FACT_TABLE} ({defs})")
+        conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {ingest.KEY_INDEX} "
+                     f"ON {FACT_TABLE} ({ingest.quote(ingest.KEY_COLUMN)})")
+        added = True
+    else:
+        added = [c for c in wanted if c not in existing]
+        for col in added:
+            conn.execute(f"ALTER TABLE {FACT_TABLE} ADD COLUMN {ingest.column_def(col, types)}")
+    if added or object_type(conn, ingest.CALLS_TABLE) != "view":
+        create_view(conn)
+
+
+def insert_dimensions(conn, source, columns):
+    """Add the dimension members found in source (a table with daily_calls column names) that are new"""
+    for dim, (key, cols) in DIMENSIONS.items():
+        present = [c for c in cols if c in columns]
+        if not present:
+            continue
+        values = ", ".join(f"s.{ingest.quote(c)}" if c in present else "NULL" for c in cols)
+        match = " AND ".join(f"d.{ingest.quote(c)} IS " + (f"s.{ingest.quote(c)}" if c in present else "NULL") for c in cols)
+        any_value = " OR ".join(f"s.{ingest.quote(c)} IS NOT NULL" for c in present)
+        conn.execute(f"""
+            INSERT INTO {dim} ({', '.join(ingest.quote(c) for c in cols)})
+            SELECT DISTINCT {values} FROM {source} s
+            WHERE ({any_value}) AND NOT EXISTS (SELECT 1 FROM {dim} d WHERE {match})
+        """)
+
+
+def fact_select(source, columns):
+    """(call_facts columns, SELECT ... FROM source s JOIN dims) mapping a daily_calls-shaped source to facts"""
+    select, joins = [], []
+    for col in fact_columns(columns):
+        dim = next((d for d, (key, cols) in DIMENSIONS.items() if key == col), None)
+        if dim:
+            cols = DIMENSIONS[dim][1]
+            match = " AND ".join(f"{dim}.{ingest.quote(c)} IS " + (f"s.{ingest.quote(c)}" if c in columns else "NULL") for c in cols)
+            select.append(f"{dim}.{col}")
+            joins.append(f"LEFT JOIN {dim} ON {match}")
+        else:
+            select.append(f"s.{ingest.quote(col)}")
+    return fact_columns(columns), f"SELECT {', '.join(select)} FROM {source} s {' '.join(joins)}"
+
+
+def convert_legacy(conn):
+    """Move a plain daily_calls table (one copy per Consultation ID) into dimensions + call_facts"""
+    conn.execute(f"ALTER TABLE {ingest.quote(ingest.CALLS_TABLE)} RENAME TO {LEGACY_TABLE}")
+    conn.execute(f"DROP INDEX IF EXISTS {ingest.KEY_INDEX}")
+    columns = ingest.table_columns(conn, LEGACY_TABLE)
+    # Older databases were filled with plain appends, so drop repeated
+    # consultations (keeping the latest copy) before the key is enforced
+    conn.execute(f"""
+        DELETE FROM {LEGACY_TABLE}
+        WHERE {ingest.quote(ingest.KEY_COLUMN)} IS NOT NULL
+          AND rowid NOT IN (
+            SELECT MAX(rowid) FROM {LEGACY_TABLE}
+            WHERE {ingest.quote(ingest.KEY_COLUMN)} IS NOT NULL
+            GROUP BY {ingest.quote(ingest.KEY_COLUMN)}
+          )
+    """)
+    ensure_layout(conn, columns)
+    insert_dimensions(conn, LEGACY_TABLE, columns)
+    fact_cols, select = fact_select(LEGACY_TABLE, columns)
+    conn.execute(f"INSERT INTO {FACT_TABLE} ({', '.join(ingest.quote(c) for c in fact_cols)}) {select}")
+    conn.execute(f"DROP TABLE {LEGACY_TABLE}")
+    # to_sql stored the API's raw text ("20 Y ", "yes", ...); parse it like a fresh load would
+    normalise_facts(conn)
+
+
+def merge_dimension_duplicates(conn, dim, parsers):
+    """
+    Apply parsers ({column: function of a Series}) to a dimension's members,
+    then merge members that became equal: their facts move to the lowest key
+    and the other members are deleted. Returns the number of members merged.
+    """
+    key, cols = DIMENSIONS[dim]
+    df = pd.read_sql_query(f"SELECT {key}, {', '.join(ingest.quote(c) for c in cols)} FROM {dim}", conn)
+    if df.empty:
+        return 0
+    for col, parse in parsers.items():
+        df[col] = parse(df[col])
+    keep = df.groupby(cols, dropna=False)[key].transform("min")
+    merged = df[df[key] != keep]
+    conn.executemany(f"UPDATE {FACT_TABLE} SET {key} = ? WHERE {key} = ?",
+                     list(zip(keep[merged.index].tolist(), merged[key].tolist())))
+    conn.executemany(f"DELETE FROM {dim} WHERE {key} = ?", [(k,) for k in merged[key].tolist()])
+    # Survivors are distinct once the duplicates are gone, so the unique index holds
+    survivors = df[df[key] == keep]
+    assignments = ", ".join(f"{ingest.quote(c)} = ?" for c in parsers)
+    conn.executemany(f"UPDATE {dim} SET {assignments} WHERE {key} = ?",
+                     [row + (k,) for row, k in zip(ingest.frame_rows(survivors[list(parsers)]),
+                                                   survivors[key].tolist())])
+    return len(merged)
+
+
+def retype_facts(conn):
+    """
+    Rebuild call_facts if its declared column types differ from fact_types
+    (e.g. PatientAge TEXT from a converted to_sql table). The rows are copied
+    as they are; normalise_facts parses them. Returns True if rebuilt.
+    """
+    declared = {row[1]: row[2] for row in conn.execute(f"PRAGMA table_info({FACT_TABLE})")}
+    types = fact_types(conn)
+    if all(kind.upper() == types.get(name, kind).upper() for name, kind in declared.items()):
+        return False
+    columns = ", ".join(ingest.quote(c) for c in declared)
+    # The view (and its triggers) would point at the old table; create_view puts them back
+    conn.execute(f"DROP VIEW IF EXISTS {ingest.quote(ingest.CALLS_TABLE)}")
+    conn.execute(f"CREATE TABLE {FACT_TABLE}_typed ({', '.join(ingest.column_def(c, types) for c in declared)})")
+    conn.execute(f"INSERT INTO {FACT_TABLE}_typed ({columns}) SELECT {columns} FROM {FACT_TABLE}")
+    conn.execute(f"DROP TABLE {FACT_TABLE}")
+    conn.execute(f"ALTER TABLE {FACT_TABLE}_typed RENAME TO {FACT_TABLE}")
+    conn.execute(f"CREATE UNIQUE INDEX {ingest.KEY_INDEX} ON {FACT_TABLE} ({ingest.quote(ingest.KEY_COLUMN)})")
+    create_view(conn)
+    return True
+
+
+def normalise_facts(conn, columns=None, chunk_rows=50000):
+    """
+    Run ingest.normalise_types over the stored call_facts rows, a rowid range
+    at a time, for the given columns (by default every one it parses). Runs in
+    the caller's transaction; returns the rows processed.
+    """
+    existing = ingest.table_columns(conn, FACT_TABLE)
+    columns = [c for c in (columns or ingest.NORMALISED_COLUMNS) if c in existing]
+    if not columns:
+        return 0
+    col_list = ", ".join(ingest.quote(c) for c in columns)
+    assignments = ", ".join(f"{ingest.quote(c)} = ?" for c in columns)
+    last, done = 0, 0
+    while True:
+        df = pd.read_sql_query(
+            f"SELECT rowid AS row_id, {col_list} FROM {FACT_TABLE} WHERE rowid > ? ORDER BY rowid LIMIT ?",
+            conn, params=(last, chunk_rows))
+        if df.empty:
+            return done
+        ids = df.pop("row_id").tolist()
+        last = ids[-1]
+        parsed = ingest.normalise_types(df)
+        conn.executemany(f"UPDATE {FACT_TABLE} SET {assignments} WHERE rowid = ?",
+                         [row + (row_id,) for row, row_id in zip(ingest.frame_rows(parsed), ids)])
+        done += len(ids)
+
+
+@data_cache.cached
+def dimension_values(column, db_path="chai.db"):
+    """Sorted distinct values of a dimension column (e.g. RegionalUnit) for filter dropdowns"""
+    dim = DIMENSION_OF[column]
+    conn = db.get_connection(db_path)
+    try:
+        create_dimension_tables(conn)
+        rows = conn.execute(f"SELECT DISTINCT {ingest.quote(column)} FROM {dim} "
+                            f"WHERE {ingest.quote(column)} IS NOT NULL ORDER BY 1").fetchall()
+    finally:
+        conn.close()
+    return [row[0] for row in rows]